@@ -1,17 +1,68 @@
+import time
+_import_started = time.perf_counter()
+
 import os
-from flask import Flask, request, render_template, jsonify, send_file
-import cv2
-import numpy as np
-import face_recognition
-from werkzeug.utils import secure_filename
-from moviepy.editor import VideoFileClip, AudioFileClip
+import logging
+import sqlite3
 import tempfile
-from lipsync_processor import LipSyncProcessor
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, render_template, jsonify, send_file, Response
+from werkzeug.utils import secure_filename
+from job_queue import JobQueue, WorkerPool, DONE
+from pipeline_metrics import PipelineMetrics, prometheus_text, read_snapshots
+from upload_store import UploadStore, UploadError
+from media_transcoder import prepare_media
+from result_cache import result_key
+from content_hash import file_digest, remember_digest
+
+# O modelo (TensorFlow, librosa, moviepy) só é carregado nos processos worker; o
+# face_recognition/dlib é importado na primeira detecção de rostos de um upload
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-limit
+# Limite por requisição (cada parte de um upload em partes); o limite por arquivo é MAX_UPLOAD_BYTES
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('LIPSYNC_MAX_REQUEST_MB', 64)) * 1024 * 1024
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('LIPSYNC_MAX_UPLOAD_MB', 4096)) * 1024 * 1024
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('LIPSYNC_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+# Maior lado (px) da resolução de trabalho; mídias maiores são reduzidas no upload (0 desabilita)
+app.config['WORKING_MAX_SIDE'] = int(os.environ.get('LIPSYNC_WORKING_MAX_SIDE', 1280))
 app.config['STATIC_FOLDER'] = 'static'
+app.config['CACHE_FOLDER'] = os.environ.get('LIPSYNC_CACHE_DIR', 'cache')
+app.config['DETECTION_CACHE_MAX_BYTES'] = int(os.environ.get('LIPSYNC_DETECTION_CACHE_MB', 512)) * 1024 * 1024
+app.config['AUDIO_CACHE_MAX_BYTES'] = int(os.environ.get('LIPSYNC_AUDIO_CACHE_MB', 1024)) * 1024 * 1024
+app.config['BATCH_SIZE'] = int(os.environ.get('LIPSYNC_BATCH_SIZE', 64))  # frames por lote de inferência
+app.config['CHUNK_SIZE'] = int(os.environ.get('LIPSYNC_CHUNK_SIZE', 256))  # frames de vídeo em memória por vez
+app.config['DETECT_INTERVAL'] = int(os.environ.get('LIPSYNC_DETECT_INTERVAL', 10))  # frames entre detecções de rostos
+app.config['DETECTION_SCALE'] = float(os.environ.get('LIPSYNC_DETECT_SCALE', 0.5))  # escala do frame na detecção
+app.config['ROI_PADDING'] = float(os.environ.get('LIPSYNC_ROI_PADDING', 0.5))  # margem da busca em volta dos rostos
+app.config['JIT_COMPILE'] = os.environ.get('LIPSYNC_XLA', '0') == '1'  # compilar inferência com XLA
+app.config['BACKEND'] = os.environ.get('LIPSYNC_BACKEND', 'keras')  # keras, tflite-fp16 ou tflite-int8
+app.config['ENCODE_OPTIONS'] = {
+    'preset': os.environ.get('LIPSYNC_PRESET', 'medium'),
+    'crf': int(os.environ.get('LIPSYNC_CRF', 23)),
+    'threads': int(os.environ.get('LIPSYNC_ENCODE_THREADS', 0)),
+}
+# Limiar de silêncio para pular a inferência ('none' desabilita)
+app.config['SILENCE_THRESHOLD'] = (None if os.environ.get('LIPSYNC_SILENCE_THRESHOLD', '-1.5') == 'none'
+                                   else float(os.environ.get('LIPSYNC_SILENCE_THRESHOLD', '-1.5')))
+# Distância (bits do dHash) para reaproveitar a última inferência em vídeos ('none' desabilita)
+app.config['DUPLICATE_THRESHOLD'] = (None if os.environ.get('LIPSYNC_DUPLICATE_THRESHOLD', '4') == 'none'
+                                     else int(os.environ.get('LIPSYNC_DUPLICATE_THRESHOLD', '4')))
+app.config['JOBS_DB'] = os.environ.get('LIPSYNC_JOBS_DB', os.path.join(app.config['CACHE_FOLDER'], 'jobs.db'))
+app.config['PIPELINED'] = os.environ.get('LIPSYNC_PIPELINE', '1') == '1'  # estágios de vídeo em threads paralelas
+# Resultados reaproveitados por jobs idênticos, limitados em espaço e idade
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('LIPSYNC_RESULT_CACHE_MB', 4096)) * 1024 * 1024
+app.config['RESULT_MAX_AGE'] = float(os.environ.get('LIPSYNC_RESULT_MAX_AGE_HOURS', 168)) * 3600
+app.config['JOB_WORKERS'] = int(os.environ.get('LIPSYNC_JOB_WORKERS', 1))  # jobs simultâneos neste nó
+app.config['METRICS_ENABLED'] = os.environ.get('LIPSYNC_METRICS', '1') == '1'  # tempos por estágio em /metrics
+app.config['METRICS_FOLDER'] = os.path.join(app.config['CACHE_FOLDER'], 'metrics')
+app.config['WARMUP'] = os.environ.get('LIPSYNC_WARMUP', '1') == '1'  # iniciar os workers junto com o app (senão, no primeiro job)
+# Segundos sem sinal de vida até um worker deixar de contar para a readiness
+app.config['WORKER_HEARTBEAT_TIMEOUT'] = float(os.environ.get('LIPSYNC_WORKER_HEARTBEAT_TIMEOUT', 30))
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -19,15 +70,117 @@ os.makedirs(app.config['STATIC_FOLDER'], exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'mp4', 'mp3', 'wav'}
 
-# Inicializar o processador de lipsync
-lipsync_processor = LipSyncProcessor()
+# Configuração do processador de lipsync (usado pelos workers e na chave dos resultados)
+processor_settings = {
+    'batch_size': app.config['BATCH_SIZE'],
+    'chunk_size': app.config['CHUNK_SIZE'],
+    'detect_interval': app.config['DETECT_INTERVAL'],
+    'detection_scale': app.config['DETECTION_SCALE'],
+    'roi_padding': app.config['ROI_PADDING'],
+    'cache_dir': app.config['CACHE_FOLDER'],
+    'detection_cache_max_bytes': app.config['DETECTION_CACHE_MAX_BYTES'],
+    'audio_cache_max_bytes': app.config['AUDIO_CACHE_MAX_BYTES'],
+    'jit_compile': app.config['JIT_COMPILE'],
+    'backend': app.config['BACKEND'],
+    'backend_dir': os.path.join(app.config['CACHE_FOLDER'], 'backends'),
+    'encode_options': app.config['ENCODE_OPTIONS'],
+    'silence_threshold': app.config['SILENCE_THRESHOLD'],
+    'duplicate_threshold': app.config['DUPLICATE_THRESHOLD'],
+    'profile': app.config['METRICS_ENABLED'],
+    'pipelined': app.config['PIPELINED'],
+}
+
+
+class PreviewDetector:
+    """Detecção de rostos para a escolha no upload, sem carregar o modelo.
+
+    Usa o mesmo `FaceDetector` e o mesmo índice persistente
+    (`DetectionCache`) dos workers, com as mesmas chaves: vídeos já
+    processados não são detectados de novo e a detecção de uma imagem é
+    reaproveitada pelo job. O dlib só é importado na primeira chamada.
+    """
+
+    def __init__(self, settings, metrics_enabled=True):
+        self.settings = settings
+        self.metrics = PipelineMetrics(enabled=metrics_enabled)
+        self.detector = None
+        self.cache = None
+        self.tracker_params = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self.detector is None:
+                from face_detector import FaceDetector
+                from face_tracker import FaceTracker
+                from detection_cache import DetectionCache
+                detector = FaceDetector(scale=self.settings['detection_scale'],
+                                        roi_padding=self.settings['roi_padding'])
+                self.tracker_params = FaceTracker(detect_interval=self.settings['detect_interval'],
+                                                  detector=detector).params()
+                self.cache = DetectionCache(os.path.join(self.settings['cache_dir'], 'detections'),
+                                            max_bytes=self.settings['detection_cache_max_bytes'])
+                self.detector = detector
+
+    def _detect(self, image):
+        with self.metrics.stage('face_detection'):
+            return self.detector.detect(image)
+
+    def image_faces(self, image_path, image_rgb):
+        self._load()
+        return self.cache.image_faces(image_path, self.detector.params(),
+                                      lambda: self._detect(image_rgb))
+
+    def video_faces(self, video_path, first_frame):
+        self._load()
+        face_locations = self.cache.first_frame_faces(video_path, self.tracker_params)
+        return face_locations if face_locations is not None else self._detect(first_frame)
+
+preview_detector = PreviewDetector(processor_settings, app.config['METRICS_ENABLED'])
+
+# Uploads em partes e análise da mídia (redução + detecção) em segundo plano
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'], max_bytes=app.config['MAX_UPLOAD_BYTES'])
+analysis_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='media-analysis')
+media_analyses = {}  # upload_id -> (instante, Future); consumidas no envio do job
+
+# Fila de jobs: o processamento roda em processos worker, fora das requisições
+job_queue = JobQueue(app.config['JOBS_DB'])
+worker_pool = WorkerPool(
+    app.config['JOBS_DB'],
+    processor_settings,
+    app.config['STATIC_FOLDER'],
+    concurrency=app.config['JOB_WORKERS'],
+    metrics_dir=app.config['METRICS_FOLDER'],
+    result_max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+    result_max_age=app.config['RESULT_MAX_AGE'],
+    heartbeat_timeout=app.config['WORKER_HEARTBEAT_TIMEOUT']
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def load_first_frame(video_path):
+    import cv2
+    capture = cv2.VideoCapture(video_path)
+    success, frame = capture.read()
+    capture.release()
+    if not success:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
 def detect_faces(image_path):
-    image = face_recognition.load_image_file(image_path)
-    face_locations = face_recognition.face_locations(image)
+    import cv2
+    import face_recognition
+
+    # Vídeos usam o primeiro frame; o índice persistente evita detectar de novo
+    if image_path.lower().endswith('.mp4'):
+        image = load_first_frame(image_path)
+        if image is None:
+            return None, "Não foi possível ler o vídeo."
+        face_locations = preview_detector.video_faces(image_path, image)
+    else:
+        image = face_recognition.load_image_file(image_path)
+        face_locations = preview_detector.image_faces(image_path, image)
     
     if len(face_locations) == 0:
         return None, "Nenhum rosto detectado na imagem/vídeo."
@@ -72,35 +225,126 @@ def upload_file():
         return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
 
     # Save files
-    media_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(media_file.filename))
-    audio_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(audio_file.filename))
-    
-    media_file.save(media_path)
-    audio_file.save(audio_path)
+    media_path = save_upload(media_file)
+    audio_path = save_upload(audio_file)
+
+    return analysis_response(analyze_media(media_path), audio_path)
+
+def save_upload(file):
+    """Grava um arquivo enviado com nome endereçado pelo conteúdo.
+
+    Envios diferentes com o mesmo nome não se sobrescrevem (o que trocaria
+    a mídia de um job em andamento), e o mesmo conteúdo reaproveita o
+    arquivo e o hash já calculado para as chaves dos caches.
+    """
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=app.config['UPLOAD_FOLDER'])
+    os.close(fd)
+    try:
+        file.save(temp_path)
+        digest = file_digest(temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f'{digest[:32]}_{secure_filename(file.filename)}')
+    os.replace(temp_path, path)
+    remember_digest(path, digest)
+    return path
+
+def analyze_media(media_path):
+    """Reduz a mídia à resolução de trabalho e detecta os rostos."""
+    try:
+        working_path, info = prepare_media(media_path, app.config['WORKING_MAX_SIDE'])
+    except Exception as e:
+        return {'error': f'Não foi possível ler a mídia: {e}'}
+    faces, error = detect_faces(working_path)
+    return {'media_path': working_path, 'info': info, 'faces': faces, 'error': error}
 
-    # Detect faces
-    faces, error = detect_faces(media_path)
-    if error:
-        return jsonify({'error': error}), 400
+def analysis_response(analysis, audio_path, face_id=None):
+    if analysis['error']:
+        return jsonify({'error': analysis['error']}), 400
 
-    if len(faces) > 1:
+    faces = analysis['faces']
+    if face_id is None and len(faces) > 1:
         # Return face options to frontend
         return jsonify({
             'multiple_faces': True,
             'faces': faces,
-            'media_path': media_path,
+            'media_path': analysis['media_path'],
             'audio_path': audio_path
         })
 
     # Process single face
+    return submit_job(analysis['media_path'], audio_path, face_id or 0)
+
+def upload_error(error):
+    response = {'error': str(error)}
+    if error.offset is not None:
+        response['offset'] = error.offset
+    return jsonify(response), error.status
+
+def upload_response(meta):
+    return {
+        'upload_id': meta['id'],
+        'offset': meta['offset'],
+        'size': meta['size'],
+        'complete': meta['path'] is not None,
+        'sha256': meta['sha256'],
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE'],
+    }
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    # Upload em partes: POST cria, PATCH envia as partes, GET informa de onde retomar
+    data = request.json or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
     try:
-        result_path = lipsync_processor.process_media(media_path, audio_path, 0)
-        return jsonify({
-            'success': True,
-            'result_path': f'/static/{os.path.basename(result_path)}'
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        meta = upload_store.create(filename, int(data.get('size', -1)), data.get('sha256'),
+                                   kind=data.get('kind'))
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify(upload_response(meta)), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    try:
+        return jsonify(upload_response(upload_store.status(upload_id)))
+    except UploadError as e:
+        return upload_error(e)
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    try:
+        offset = int(request.headers.get('Upload-Offset', -1))
+        # Lido do stream em blocos: a parte nunca fica inteira em memória
+        meta = upload_store.append(upload_id, offset, request.stream, request.content_length)
+    except UploadError as e:
+        return upload_error(e)
+
+    # A mídia começa a ser analisada enquanto o áudio ainda está sendo enviado
+    if meta['path'] is not None and meta['kind'] == 'media':
+        # Análises de uploads nunca enviados expiram junto com os uploads
+        limit = time.time() - upload_store.max_age
+        for stale_id in [key for key, (started, _) in list(media_analyses.items()) if started < limit]:
+            media_analyses.pop(stale_id, None)
+        media_analyses[upload_id] = (time.time(), analysis_executor.submit(analyze_media, meta['path']))
+    return jsonify(upload_response(meta))
+
+@app.route('/uploads/submit', methods=['POST'])
+def submit_uploads():
+    data = request.json or {}
+    try:
+        media = upload_store.status(data.get('media_upload_id'))
+        audio = upload_store.status(data.get('audio_upload_id'))
+    except UploadError as e:
+        return upload_error(e)
+    if media['path'] is None or audio['path'] is None:
+        return jsonify({'error': 'Upload incompleto'}), 409
+
+    _, future = media_analyses.pop(media['id'], (None, None))
+    analysis = future.result() if future is not None else analyze_media(media['path'])
+    return analysis_response(analysis, audio['path'], data.get('face_id'))
 
 @app.route('/process', methods=['POST'])
 def process():
@@ -109,23 +353,109 @@ def process():
     audio_path = data.get('audio_path')
     face_id = data.get('face_id')
     
+    return submit_job(media_path, audio_path, face_id)
+
+def submit_job(media_path, audio_path, face_id):
+    # Mesmas entradas e parâmetros: devolver o resultado pronto ou o job em andamento
     try:
-        result_path = lipsync_processor.process_media(media_path, audio_path, face_id)
-        # Mover o resultado para a pasta static
-        static_result_path = os.path.join(app.config['STATIC_FOLDER'], os.path.basename(result_path))
-        os.rename(result_path, static_result_path)
-        
-        return jsonify({
-            'success': True,
-            'result_path': f'/static/{os.path.basename(result_path)}'
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        key = result_key(media_path, audio_path, face_id, processor_settings)
+    except (OSError, TypeError, ValueError, KeyError):
+        key = None  # entradas inválidas: o worker reporta o erro no job
+    worker_pool.start()
+    job_id = job_queue.submit(media_path, audio_path, face_id, result_key=key)
+
+    job = job_queue.get(job_id)
+    if job['status'] == DONE:
+        return jsonify(dict(job_response(job), status_url=f'/jobs/{job_id}'))
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}'
+    }), 202
+
+def job_response(job):
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress'],
+    }
+    if job['status'] == DONE:
+        response['result_path'] = f'/static/{os.path.basename(job["result_path"])}'
+    if job['error']:
+        response['error'] = job['error']
+    return response
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/metrics')
+def metrics():
+    # Métricas dos workers de processamento e da detecção feita no upload
+    snapshots = read_snapshots(app.config['METRICS_FOLDER'])
+    if preview_detector.metrics.enabled:
+        snapshots.append(preview_detector.metrics.snapshot())
+    gauges = [('jobs', {'status': status}, total)
+              for status, total in job_queue.count_by_status().items()]
+    gauges += [('startup_seconds', {'phase': phase}, round(seconds, 3))
+               for phase, seconds in startup_times().items() if seconds is not None]
+    return Response(prometheus_text(snapshots, gauges=gauges),
+                    mimetype='text/plain; version=0.0.4')
+
+def startup_times(workers=None):
+    if workers is None:
+        workers = job_queue.live_workers(app.config['WORKER_HEARTBEAT_TIMEOUT'])
+    return {
+        'import': IMPORT_SECONDS,
+        # Carregamento do modelo no worker iniciado mais recentemente
+        'processor_load': workers[0]['ready_at'] - workers[0]['started_at'] if workers else None,
+    }
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: o processo responde, mesmo que o modelo ainda esteja carregando
+    return jsonify({
+        'status': 'ok',
+        'uptime_seconds': round(time.perf_counter() - _import_started, 3),
+    })
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: fila de jobs acessível e ao menos um worker com o modelo carregado
+    try:
+        workers = job_queue.live_workers(app.config['WORKER_HEARTBEAT_TIMEOUT'])
+    except sqlite3.Error as e:
+        return jsonify({'ready': False, 'error': f'Fila de jobs indisponível: {e}'}), 503
+    response = {
+        'ready': bool(workers),
+        'workers': len(workers),
+        'startup_seconds': startup_times(workers),
+    }
+    # Só informa o estado: os workers são iniciados com o app ou no primeiro job
+    return jsonify(response), (200 if workers else 503)
 
 @app.route('/face/<int:face_id>')
 def get_face(face_id):
     face_path = os.path.join(app.config['STATIC_FOLDER'], f'face_{face_id}.jpg')
     return send_file(face_path, mimetype='image/jpeg')
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+logger.info(f"app importado em {IMPORT_SECONDS:.2f}s")
+
+# Não iniciar workers a partir dos workers (que reimportam este módulo ao usar 'spawn') nem no
+# processo pai do reloader do modo debug, só no filho (WERKZEUG_RUN_MAIN)
+if app.config['WARMUP'] and multiprocessing.parent_process() is None and \
+        (__name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN')):
+    worker_pool.start()
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+from disk_cache import evict_lru
+
+
+class AudioFeatureCache:
+    """Cache em dois níveis para espectrogramas mel.
+
+    O primeiro nível é um LRU em memória com até `max_items` entradas; o
+    segundo guarda cada espectrograma como `.npy` em `cache_dir`, aberto
+    com memory-map ao ser lido, e é limitado a `max_bytes` (evicção LRU
+    pelo mtime). As chaves vêm de `AudioProcessor.feature_key`.
+    """
+
+    def __init__(self, cache_dir='cache/audio', max_items=32, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npy')
+
+    def _remember(self, key, mel):
+        with self._lock:
+            self._memory[key] = mel
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Retorna o espectrograma da chave, ou None se não estiver em cache."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        if not self.cache_dir:
+            self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            mel = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        # Marcar como usado recentemente para a evicção LRU em disco
+        os.utime(path, None)
+        self._remember(key, mel)
+        return mel
+
+    def put(self, key, mel):
+        """Armazena um espectrograma nos dois níveis do cache."""
+        if self.cache_dir:
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as file:
+                np.save(file, mel)
+            os.replace(temp_path, self._path(key))
+            evict_lru(self.cache_dir, self.max_bytes)
+
+        self._remember(key, mel)
@@ -1,17 +1,45 @@
-import librosa
 import numpy as np
-import tensorflow as tf
-from scipy.interpolate import interp1d
+from content_hash import content_key
+
+# librosa e TensorFlow são importados sob demanda: o cache de espectrogramas
+# e o janelamento não precisam deles, e ambos demoram a carregar
 
 class AudioProcessor:
-    def __init__(self, sampling_rate=16000, mel_step_size=16, mel_window_size=800, mel_channels=80):
+    def __init__(self, sampling_rate=16000, mel_step_size=16, mel_window_size=800, mel_channels=80,
+                 feature_cache=None):
         self.sampling_rate = sampling_rate
         self.mel_step_size = mel_step_size
         self.mel_window_size = mel_window_size
         self.mel_channels = mel_channels
 
+        # Cache de espectrogramas (AudioFeatureCache), opcional
+        self.feature_cache = feature_cache
+        self._mel_basis = None
+
+    @property
+    def mel_basis(self):
+        """Banco de filtros mel, calculado uma única vez por instância."""
+        if self._mel_basis is None:
+            import librosa
+            self._mel_basis = librosa.filters.mel(
+                sr=self.sampling_rate,
+                n_fft=self.mel_window_size,
+                n_mels=self.mel_channels
+            )
+        return self._mel_basis
+
+    def feature_key(self, audio_path):
+        """Chave de cache: hash do áudio + parâmetros do espectrograma."""
+        return content_key(audio_path, {
+            'sampling_rate': self.sampling_rate,
+            'mel_step_size': self.mel_step_size,
+            'mel_window_size': self.mel_window_size,
+            'mel_channels': self.mel_channels,
+        })
+
     def load_audio(self, audio_path):
         """Carrega e normaliza o áudio."""
+        import librosa
         audio, sr = librosa.load(audio_path, sr=self.sampling_rate)
         
         # Normalizar o áudio
@@ -21,17 +49,23 @@ class AudioProcessor:
 
     def extract_mel_features(self, audio_path):
         """Extrai características mel-spectrogram do áudio."""
+        if self.feature_cache is None:
+            return self._compute_mel_features(audio_path)
+        
+        key = self.feature_key(audio_path)
+        mel = self.feature_cache.get(key)
+        if mel is None:
+            mel = self._compute_mel_features(audio_path)
+            self.feature_cache.put(key, mel)
+        return mel
+
+    def _compute_mel_features(self, audio_path):
+        """Calcula o mel-spectrogram normalizado de um arquivo de áudio."""
         # Carregar áudio
         audio, _ = self.load_audio(audio_path)
         
-        # Calcular mel spectrogram
-        mel_basis = librosa.filters.mel(
-            sr=self.sampling_rate,
-            n_fft=self.mel_window_size,
-            n_mels=self.mel_channels
-        )
-        
         # Calcular STFT
+        import librosa
         stft = librosa.core.stft(
             y=audio,
             n_fft=self.mel_window_size,
@@ -40,7 +74,7 @@ class AudioProcessor:
         )
         
         # Converter para mel scale
-        mel = np.dot(mel_basis, np.abs(stft))
+        mel = np.dot(self.mel_basis, np.abs(stft))
         
         # Converter para dB
         mel = np.log(np.clip(mel, a_min=1e-5, a_max=None))
@@ -50,23 +84,62 @@ class AudioProcessor:
         
         return mel
 
+    @property
+    def mel_fps(self):
+        """Número de frames mel por segundo de áudio."""
+        return self.sampling_rate / self.mel_step_size
+
     def align_audio_to_video(self, mel_features, video_frames):
         """Alinha as características do áudio com os frames do vídeo."""
         # Obter número de frames de áudio e vídeo
         n_audio_frames = mel_features.shape[1]
         n_video_frames = len(video_frames)
         
-        # Criar função de interpolação
-        x = np.linspace(0, n_audio_frames - 1, n_audio_frames)
-        x_new = np.linspace(0, n_audio_frames - 1, n_video_frames)
+        # Interpolação linear de todos os canais mel de uma vez
+        positions = np.linspace(0, n_audio_frames - 1, n_video_frames)
+        left = np.floor(positions).astype(np.int64)
+        right = np.minimum(left + 1, n_audio_frames - 1)
+        weights = (positions - left).astype(mel_features.dtype)
+        
+        return mel_features[:, left] * (1 - weights) + mel_features[:, right] * weights
+
+    def mel_windows(self, mel_features, n_frames, fps, window=16, start_frame=0):
+        """Retorna as janelas mel de cada frame de vídeo.
+
+        Produz um array (n_frames, n_mels, window, 1) em que a janela do frame
+        `i` começa no frame mel correspondente ao instante
+        `(start_frame + i) / fps`. Todas as janelas são obtidas numa única
+        indexação sobre uma view com strides do trecho do espectrograma coberto
+        pelos frames (com padding de borda), sem objetos por canal, e podem ir
+        direto ao modelo em lotes.
+        """
+        n_mels, n_audio_frames = mel_features.shape
+        if n_frames <= 0:
+            return np.empty((0, n_mels, window, 1), dtype=mel_features.dtype)
         
-        # Interpolar para cada canal mel
-        aligned_features = []
-        for channel in range(mel_features.shape[0]):
-            interpolator = interp1d(x, mel_features[channel], kind='linear')
-            aligned_features.append(interpolator(x_new))
+        # Índice inicial de cada janela, limitado ao fim do áudio
+        frame_ids = np.arange(start_frame, start_frame + n_frames)
+        starts = (frame_ids * self.mel_fps / fps).astype(np.int64)
+        starts = np.minimum(starts, max(n_audio_frames - 1, 0))
         
-        return np.array(aligned_features)
+        # Só o trecho usado pelas janelas é copiado (chamadas por bloco de
+        # frames não percorrem o espectrograma inteiro); o padding de borda
+        # completa as janelas que passam do fim do áudio
+        first, last = int(starts[0]), int(starts[-1]) + window
+        segment = mel_features[:, first:last]
+        padded = np.pad(segment, ((0, 0), (0, last - first - segment.shape[1])), mode='edge')
+        padded = np.ascontiguousarray(padded.T)  # (tempo, n_mels)
+        
+        all_windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+        # all_windows: (tempo - window + 1, n_mels, window)
+        return all_windows[starts - first][..., np.newaxis]
+
+    def silent_windows(self, mel_windows, threshold):
+        """Marca as janelas cuja energia média (log-mel normalizado) fica abaixo do limiar."""
+        mel_windows = np.asarray(mel_windows)
+        if threshold is None or len(mel_windows) == 0:
+            return np.zeros(len(mel_windows), dtype=bool)
+        return mel_windows.mean(axis=tuple(range(1, mel_windows.ndim))) < threshold
 
     def preprocess_audio(self, audio_path, video_frames=None):
         """Processa o áudio completo para uso no modelo."""
@@ -78,6 +151,7 @@ class AudioProcessor:
             mel_features = self.align_audio_to_video(mel_features, video_frames)
         
         # Converter para tensor
+        import tensorflow as tf
         mel_features = tf.convert_to_tensor(mel_features, dtype=tf.float32)
         
         # Adicionar dimensão de batch
@@ -0,0 +1,179 @@
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pipeline_metrics import summarize
+
+logger = logging.getLogger(__name__)
+
+# Processador carregado uma única vez em cada processo do pool
+_worker_processor = None
+
+
+def load_manifest(manifest_path):
+    """Lê um manifesto CSV ou JSONL de jobs.
+
+    Cada job tem `media`, `audio`, `face_id` (opcional, padrão 0) e
+    `output`; `job_id` é opcional e, se ausente, o caminho de saída
+    identifica o job (usado para retomar a execução). `faces` (opcional,
+    lista JSON de rostos com áudio e intervalos) substitui `face_id`.
+    """
+    with open(manifest_path, newline='') as file:
+        if manifest_path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+
+    jobs = []
+    for line_number, row in enumerate(rows, start=1):
+        missing = [field for field in ('media', 'audio', 'output') if not row.get(field)]
+        if missing:
+            raise ValueError(f"Linha {line_number} do manifesto sem os campos: {', '.join(missing)}")
+        faces = row.get('faces')
+        if isinstance(faces, str):
+            faces = json.loads(faces) if faces.strip() else None
+        jobs.append({
+            'job_id': str(row.get('job_id') or row['output']),
+            'media': row['media'],
+            'audio': row['audio'],
+            'face_id': faces or int(row.get('face_id') or 0),
+            'output': row['output'],
+        })
+    return jobs
+
+
+def completed_job_ids(results_path):
+    """IDs dos jobs concluídos com sucesso numa execução anterior."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path) as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # linha truncada por uma queda
+            if result.get('status') == 'ok' and os.path.exists(result.get('output', '')):
+                done.add(result['job_id'])
+    return done
+
+
+def group_by_media(jobs):
+    """Agrupa os jobs pela mídia, preservando a ordem do manifesto."""
+    groups = OrderedDict()
+    for job in jobs:
+        groups.setdefault(job['media'], []).append(job)
+    return list(groups.values())
+
+
+def split_groups(groups, workers):
+    """Divide grupos grandes para ocupar todos os workers.
+
+    Com poucas mídias e muitos áudios (um vídeo com vários áudios, por
+    exemplo), manter cada mídia num único worker deixaria os outros
+    ociosos. Grupos maiores que a fatia de cada worker são divididos em
+    partes consecutivas desse tamanho; os demais ficam inteiros.
+    """
+    total = sum(len(group) for group in groups)
+    part_size = max(1, -(-total // max(1, workers)))
+    parts = []
+    for group in groups:
+        parts.append([group[start:start + part_size] for start in range(0, len(group), part_size)])
+    return parts
+
+
+def _append_result(results_path, result):
+    # Uma única escrita por linha em modo append: seguro entre processos
+    with open(results_path, 'a') as file:
+        file.write(json.dumps(result) + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _init_worker(processor_settings):
+    global _worker_processor
+    from lipsync_processor import LipSyncProcessor
+    _worker_processor = LipSyncProcessor.from_settings(processor_settings)
+
+
+def _run_group(jobs, results_path):
+    """Processa todos os jobs de uma mesma mídia no processador do worker.
+
+    Os jobs rodam em sequência no mesmo processo, então a detecção de
+    rostos (índice de detecções) e a codificação da face (imagens) feitas
+    no primeiro job são reaproveitadas pelos seguintes.
+    """
+    processor = _worker_processor
+    for job in jobs:
+        if processor.metrics.enabled:
+            processor.reset_metrics()
+        started = time.time()
+        result = {'job_id': job['job_id'], 'media': job['media'], 'audio': job['audio'],
+                  'face_id': job['face_id'], 'output': job['output']}
+        try:
+            result_path = processor.process_media(job['media'], job['audio'], job['face_id'])
+            output_dir = os.path.dirname(job['output'])
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            shutil.move(result_path, job['output'])
+            result.update(status='ok', stats=processor.last_stats)
+        except Exception as e:
+            result.update(status='error', error=str(e))
+        result['seconds'] = round(time.time() - started, 3)
+        result['worker_pid'] = os.getpid()
+        if processor.metrics.enabled:
+            result['profile'] = summarize(processor.metrics_snapshot())
+        _append_result(results_path, result)
+    return len(jobs)
+
+
+def run_batch(processor_settings, manifest_path, results_path, workers=1):
+    """Executa um manifesto de jobs num pool local de workers.
+
+    Jobs já concluídos em `results_path` são pulados, então uma execução
+    interrompida pode ser retomada com o mesmo comando. Retorna o número
+    de jobs processados nesta execução.
+
+    Mídias com mais jobs que a fatia de cada worker são repartidas entre
+    vários workers (`split_groups`). Com o índice persistente de detecções
+    (`cache_dir`), o primeiro job dessas mídias roda sozinho antes das
+    demais partes, que então reaproveitam a detecção em vez de repeti-la
+    em paralelo.
+    """
+    jobs = load_manifest(manifest_path)
+    done = completed_job_ids(results_path)
+    pending = [job for job in jobs if job['job_id'] not in done]
+    groups = split_groups(group_by_media(pending), workers)
+    logger.info(f"{len(pending)} de {len(jobs)} jobs pendentes em {len(groups)} mídias")
+
+    results_dir = os.path.dirname(results_path)
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+
+    processed = 0
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context,
+                             initializer=_init_worker, initargs=(processor_settings,)) as pool:
+        futures = {}  # future -> partes da mídia liberadas quando ele terminar
+        for parts in groups:
+            if len(parts) > 1 and processor_settings.get('cache_dir'):
+                first, parts[0] = parts[0][:1], parts[0][1:]
+                futures[pool.submit(_run_group, first, results_path)] = [part for part in parts if part]
+            else:
+                for part in parts:
+                    futures[pool.submit(_run_group, part, results_path)] = []
+
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for part in futures.pop(future):
+                    futures[pool.submit(_run_group, part, results_path)] = []
+                processed += future.result()
+                logger.info(f"{processed}/{len(pending)} jobs processados")
+    return processed
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Benchmarks do pipeline de lipsync com mídia sintética.
+
+Executar a partir da raiz do projeto:
+
+    python -m benchmarks.run_benchmarks --quick
+    python -m benchmarks.run_benchmarks --save-baseline
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+
+Todas as entradas (áudio parecido com fala, imagens e vídeos com rostos
+desenhados ou com uma foto de fixture) são geradas localmente, e o modelo
+usa pesos aleatórios: não há acesso à rede nem dependência de GPU.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import synthetic_media
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Matriz de entradas: a completa e a reduzida (--quick)
+FULL_MATRIX = {
+    'audio_durations': [2, 10, 30],
+    'resolutions': [(640, 360), (1280, 720), (1920, 1080)],
+    'face_counts': [1, 2, 4],
+    'detection_scales': [1.0, 0.5, 0.25],
+    'predict_batch_sizes': [1, 16, 64],
+    'end_to_end_duration': 4,
+}
+QUICK_MATRIX = {
+    'audio_durations': [2, 10],
+    'resolutions': [(640, 360)],
+    'face_counts': [1, 2],
+    'detection_scales': [0.5],
+    'predict_batch_sizes': [1, 16],
+    'end_to_end_duration': 2,
+}
+
+
+def measure(function, repeat, warmup=1, units=None):
+    """Executa `function` e retorna min/mediana/média (ms) e, se houver, unidades/s."""
+    for _ in range(warmup):
+        function()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    result = {
+        'repeat': repeat,
+        'min_ms': round(min(times) * 1000, 3),
+        'median_ms': round(median * 1000, 3),
+        'mean_ms': round(statistics.mean(times) * 1000, 3),
+    }
+    if units:
+        result['units'] = units
+        result['units_per_second'] = round(units / median, 3) if median else None
+    return result
+
+
+def environment_info():
+    """Informações da máquina gravadas junto dos resultados."""
+    import cv2
+    import tensorflow as tf
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'tensorflow': tf.__version__,
+    }
+
+
+class BenchmarkSuite:
+    """Gera as entradas sintéticas e mede cada estágio do pipeline."""
+
+    def __init__(self, work_dir, matrix, repeat=3, batch_size=64, face_image=None, seed=0,
+                 only=None):
+        self.work_dir = work_dir
+        self.matrix = matrix
+        self.repeat = repeat
+        self.batch_size = batch_size
+        self.face_image = face_image
+        self.seed = seed
+        self.only = only
+        self.results = {}
+        self.audio_paths = {}
+
+    def _enabled(self, group):
+        return not self.only or group in self.only
+
+    def _record(self, name, result):
+        self.results[name] = result
+        logger.info(f"{name}: mediana {result['median_ms']:.1f} ms")
+
+    def prepare_audio(self):
+        for duration in self.matrix['audio_durations'] + [self.matrix['end_to_end_duration']]:
+            if duration not in self.audio_paths:
+                path = os.path.join(self.work_dir, f'speech_{duration}s.wav')
+                samples = synthetic_media.synthetic_speech(duration, seed=self.seed)
+                self.audio_paths[duration] = synthetic_media.write_wav(path, samples)
+
+    def bench_audio(self):
+        from audio_processor import AudioProcessor
+
+        for duration in self.matrix['audio_durations']:
+            path = self.audio_paths[duration]
+            # Sem cache: mede sempre o cálculo completo do espectrograma
+            audio_processor = AudioProcessor()
+            self._record(f'mel_extraction/audio={duration}s',
+                         measure(lambda: audio_processor.extract_mel_features(path), self.repeat))
+
+            mel = audio_processor.extract_mel_features(path)
+            for fps in (25, 30):
+                frames = [None] * int(duration * fps)
+                self._record(f'align_audio_to_video/audio={duration}s,fps={fps}',
+                             measure(lambda: audio_processor.align_audio_to_video(mel, frames),
+                                     self.repeat, units=len(frames)))
+
+    def bench_detection(self):
+        import face_recognition
+        from face_detector import FaceDetector
+
+        for width, height in self.matrix['resolutions']:
+            for n_faces in self.matrix['face_counts']:
+                path = os.path.join(self.work_dir, f'faces_{width}x{height}_{n_faces}.png')
+                boxes = synthetic_media.make_image(path, (width, height), n_faces, self.face_image, self.seed)
+                image = face_recognition.load_image_file(path)
+                result = measure(lambda: face_recognition.face_locations(image), self.repeat)
+                # Rostos desenhados nem sempre são encontrados pelo HOG; use --face-image
+                result['faces_found'] = len(face_recognition.face_locations(image))
+                result['faces_expected'] = n_faces
+                self._record(f'detection/res={width}x{height},faces={n_faces}', result)
+
+                # Frame reduzido e busca só em volta das caixas conhecidas
+                for scale in self.matrix['detection_scales']:
+                    detector = FaceDetector(scale=scale)
+                    result = measure(lambda: detector.detect(image), self.repeat)
+                    result['faces_found'] = len(detector.detect(image))
+                    self._record(f'detection_scaled/res={width}x{height},faces={n_faces},scale={scale}',
+                                 result)
+                    self._record(f'detection_roi/res={width}x{height},faces={n_faces},scale={scale}',
+                                 measure(lambda: detector.detect_near(image, boxes), self.repeat))
+
+    def bench_model(self):
+        from wav2lip_model import Wav2LipModel
+
+        rng = np.random.default_rng(self.seed)
+        model = Wav2LipModel()  # pesos aleatórios
+        face = rng.integers(0, 256, (96, 96, 3), dtype=np.uint8).astype(np.float32)
+        mel = rng.standard_normal((1, 80, 16, 1)).astype(np.float32)
+        self._record('model_predict/single', measure(lambda: model.predict(face, mel), self.repeat))
+
+        for batch_size in self.matrix['predict_batch_sizes']:
+            faces = rng.integers(0, 256, (batch_size, 96, 96, 3), dtype=np.uint8)
+            mels = rng.standard_normal((batch_size, 80, 16, 1)).astype(np.float32)
+            model.compile_inference(batch_size=batch_size, mel_window=16)
+            self._record(f'model_predict_batch/batch={batch_size}',
+                         measure(lambda: model.predict_batch(faces, mels, batch_size=batch_size),
+                                 self.repeat, units=batch_size))
+
+    def bench_blend(self, processor):
+        for width, height in self.matrix['resolutions']:
+            frame = synthetic_media.background((width, height), self.seed)
+            box = synthetic_media.face_boxes((width, height), 1)[0]
+            top, right, bottom, left = box
+            new_face = np.full((bottom - top, right - left, 3), 128, dtype=np.uint8)
+            self._record(f'blend_face/res={width}x{height}',
+                         measure(lambda: processor._blend_face(frame, new_face, box), self.repeat * 10))
+
+    def bench_end_to_end(self, processor):
+        duration = self.matrix['end_to_end_duration']
+        audio_path = self.audio_paths[duration]
+        cache = processor.detection_cache
+
+        for width, height in self.matrix['resolutions']:
+            for n_faces in self.matrix['face_counts'][:2]:
+                # As caixas conhecidas vão para o índice de detecções, para que o
+                # resultado não dependa de o detector encontrar rostos sintéticos
+                image_path = os.path.join(self.work_dir, f'e2e_{width}x{height}_{n_faces}.png')
+                boxes = synthetic_media.make_image(image_path, (width, height), n_faces,
+                                                   self.face_image, self.seed)
+                cache.store(cache.key(image_path, processor.face_detector.params()), [boxes])
+
+                video_path = os.path.join(self.work_dir, f'e2e_{width}x{height}_{n_faces}.mp4')
+                frame_boxes = synthetic_media.make_video(video_path, (width, height), duration,
+                                                         n_faces=n_faces, face_image=self.face_image,
+                                                         seed=self.seed)
+                params = processor.create_tracker().params()
+                cache.store(cache.key(video_path, params), frame_boxes + frame_boxes[-1:] * 30)
+
+                for kind, media_path in (('image', image_path), ('video', video_path)):
+                    def run():
+                        os.remove(processor.process_media(media_path, audio_path, face_id=0))
+                    self._record(f'end_to_end/{kind},res={width}x{height},faces={n_faces},audio={duration}s',
+                                 measure(run, self.repeat, units=int(duration * 30)))
+
+    def run(self):
+        from lipsync_processor import LipSyncProcessor
+        from detection_cache import DetectionCache
+
+        self.prepare_audio()
+        if self._enabled('audio'):
+            self.bench_audio()
+        if self._enabled('detection'):
+            self.bench_detection()
+        if self._enabled('model'):
+            self.bench_model()
+
+        if self._enabled('blend') or self._enabled('end_to_end'):
+            processor = LipSyncProcessor(
+                batch_size=self.batch_size,
+                detection_cache=DetectionCache(os.path.join(self.work_dir, 'detections')),
+            )
+            if self._enabled('blend'):
+                self.bench_blend(processor)
+            if self._enabled('end_to_end'):
+                self.bench_end_to_end(processor)
+
+        return self.results
+
+
+def compare(results, baseline, tolerance):
+    """Compara as medianas com a baseline; retorna as linhas do relatório e as regressões."""
+    rows = []
+    regressions = []
+    for name, current in sorted(results['results'].items()):
+        reference = baseline['results'].get(name)
+        if reference is None:
+            rows.append((name, current['median_ms'], None, None, 'novo'))
+            continue
+        ratio = current['median_ms'] / reference['median_ms'] if reference['median_ms'] else 1.0
+        if ratio > 1 + tolerance:
+            status = 'REGRESSÃO'
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            status = 'melhora'
+        else:
+            status = 'ok'
+        rows.append((name, current['median_ms'], reference['median_ms'], ratio, status))
+    return rows, regressions
+
+
+def print_comparison(rows):
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"{'benchmark':<{width}}  {'atual ms':>10}  {'base ms':>10}  {'razão':>6}  status")
+    for name, current, reference, ratio, status in rows:
+        reference_text = f'{reference:10.1f}' if reference is not None else f"{'-':>10}"
+        ratio_text = f'{ratio:6.2f}' if ratio is not None else f"{'-':>6}"
+        print(f'{name:<{width}}  {current:10.1f}  {reference_text}  {ratio_text}  {status}')
+
+
+def configure_determinism(seed, threads):
+    """Fixa sementes e, opcionalmente, o número de threads de TF e OpenCV."""
+    import cv2
+    import tensorflow as tf
+
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(threads)
+        cv2.setNumThreads(threads)
+    tf.keras.utils.set_random_seed(seed)
+    # Os benchmarks rodam só na CPU, mesmo que haja GPU visível
+    tf.config.set_visible_devices([], 'GPU')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks do pipeline de lipsync com mídia sintética (somente CPU, sem rede)'
+    )
+    parser.add_argument('-o', '--output', type=str, default='benchmark_results.json',
+                      help='Arquivo JSON com os resultados (padrão: benchmark_results.json)')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+                      help='Baseline para comparação, se existir (padrão: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                      help='Gravar os resultados desta execução como a nova baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                      help='Aumento relativo da mediana tolerado antes de acusar regressão (padrão: 0.10)')
+    parser.add_argument('--quick', action='store_true',
+                      help='Usar a matriz reduzida de entradas')
+    parser.add_argument('--only', nargs='+',
+                      choices=['audio', 'detection', 'model', 'blend', 'end_to_end'],
+                      help='Rodar apenas os grupos de benchmarks informados')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                      help='Repetições medidas de cada benchmark (padrão: 3)')
+    parser.add_argument('-b', '--batch-size', type=int, default=64,
+                      help='Frames por lote de inferência no teste completo (padrão: 64)')
+    parser.add_argument('--face-image', type=str,
+                      help='Foto de rosto usada no lugar dos rostos desenhados')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Semente das entradas e dos pesos aleatórios (padrão: 0)')
+    parser.add_argument('--threads', type=int, default=0,
+                      help='Threads de TensorFlow e OpenCV, 0 para automático (padrão: 0)')
+    parser.add_argument('--keep-media', action='store_true',
+                      help='Não apagar a mídia sintética gerada')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    configure_determinism(args.seed, args.threads)
+
+    work_dir = tempfile.mkdtemp(prefix='lipsync_bench_')
+    try:
+        suite = BenchmarkSuite(
+            work_dir,
+            QUICK_MATRIX if args.quick else FULL_MATRIX,
+            repeat=args.repeat,
+            batch_size=args.batch_size,
+            face_image=synthetic_media.load_face_image(args.face_image),
+            seed=args.seed,
+            only=args.only
+        )
+        results = {
+            'environment': environment_info(),
+            'config': {'quick': args.quick, 'repeat': args.repeat, 'batch_size': args.batch_size,
+                       'seed': args.seed, 'threads': args.threads,
+                       'face_image': os.path.basename(args.face_image) if args.face_image else None},
+            'results': suite.run(),
+        }
+    finally:
+        if args.keep_media:
+            logger.info(f"Mídia sintética mantida em {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    logger.info(f"Resultados salvos em {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        logger.info(f"Baseline atualizada em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        logger.info("Nenhuma baseline encontrada; use --save-baseline para criar uma")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline['environment'].get('machine') != results['environment']['machine'] or \
+            baseline['environment'].get('cpu_count') != results['environment']['cpu_count']:
+        logger.warning("A baseline foi gerada em outra máquina; as razões podem não ser comparáveis")
+
+    rows, regressions = compare(results, baseline, args.tolerance)
+    print_comparison(rows)
+    if regressions:
+        logger.error(f"{len(regressions)} regressão(ões) acima de {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import wave
+
+import cv2
+import numpy as np
+
+from video_writer import FFmpegWriter
+
+SAMPLING_RATE = 16000
+
+
+def synthetic_speech(duration, sampling_rate=SAMPLING_RATE, seed=0):
+    """Gera um sinal parecido com fala: vogais harmônicas em sílabas com pausas.
+
+    A frequência fundamental oscila entre ~90 e ~210 Hz, os formantes são
+    aproximados por harmônicos com pesos variáveis e a amplitude segue um
+    envelope de ~4 sílabas por segundo, com pausas de silêncio entre frases
+    (úteis para exercitar o caminho de silêncio do pipeline).
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * sampling_rate)
+    t = np.arange(n_samples) / sampling_rate
+
+    f0 = 150 + 60 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 2 * np.pi))
+    phase = 2 * np.pi * np.cumsum(f0) / sampling_rate
+    formant_weights = 0.5 + 0.5 * np.sin(2 * np.pi * 1.7 * t[:, np.newaxis] + np.arange(1, 9))
+    voiced = np.sum(formant_weights * np.sin(phase[:, np.newaxis] * np.arange(1, 9)) / np.arange(1, 9), axis=1)
+
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    phrases = (np.sin(2 * np.pi * 0.25 * t) > -0.6).astype(np.float64)
+    noise = 0.05 * rng.standard_normal(n_samples)
+    signal = (voiced * syllables + noise * syllables) * phrases + 0.001 * rng.standard_normal(n_samples)
+    return (signal / np.abs(signal).max()).astype(np.float32)
+
+
+def write_wav(path, samples, sampling_rate=SAMPLING_RATE):
+    """Grava amostras float em [-1, 1] como WAV PCM 16 bits mono."""
+    with wave.open(path, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(sampling_rate)
+        file.writeframes((samples * 32767).astype('<i2').tobytes())
+    return path
+
+
+def face_boxes(size, n_faces, offset=(0, 0)):
+    """Caixas (top, right, bottom, left) de `n_faces` rostos lado a lado no frame."""
+    width, height = size
+    face_height = int(height * 0.5)
+    face_width = min(int(face_height * 0.75), width // (n_faces + 1))
+    top = (height - face_height) // 2 + offset[1]
+    boxes = []
+    for idx in range(n_faces):
+        center_x = (idx + 1) * width // (n_faces + 1) + offset[0]
+        left = center_x - face_width // 2
+        boxes.append((top, left + face_width, top + face_height, left))
+    return boxes
+
+
+def draw_face(frame, box, mouth_open=0.3, face_image=None):
+    """Desenha um rosto na caixa: a foto de `face_image` ou um rosto sintético."""
+    top, right, bottom, left = box
+    width, height = right - left, bottom - top
+    if face_image is not None:
+        frame[top:bottom, left:right] = cv2.resize(face_image, (width, height),
+                                                   interpolation=cv2.INTER_AREA)
+        return frame
+
+    center = (left + width // 2, top + height // 2)
+    cv2.ellipse(frame, center, (width // 2, height // 2), 0, 0, 360, (205, 160, 130), -1)
+    cv2.ellipse(frame, (center[0], top + height // 6), (width // 2, height // 5), 0, 180, 360,
+                (60, 40, 30), -1)
+    for side in (-1, 1):
+        eye = (center[0] + side * width // 5, top + int(height * 0.42))
+        cv2.line(frame, (eye[0] - width // 10, eye[1] - height // 12),
+                 (eye[0] + width // 10, eye[1] - height // 12), (70, 50, 40), max(1, height // 60))
+        cv2.ellipse(frame, eye, (width // 10, height // 24), 0, 0, 360, (245, 245, 245), -1)
+        cv2.circle(frame, eye, max(1, height // 36), (50, 35, 25), -1)
+    cv2.line(frame, (center[0], top + int(height * 0.45)), (center[0] - width // 20, top + int(height * 0.62)),
+             (150, 110, 90), max(1, height // 80))
+    mouth = (center[0], top + int(height * 0.75))
+    cv2.ellipse(frame, mouth, (width // 6, max(2, int(height * 0.08 * mouth_open))), 0, 0, 360,
+                (120, 40, 50), -1)
+    return frame
+
+
+def background(size, seed=0):
+    """Fundo com gradiente e textura leve, sempre o mesmo para a mesma semente."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(40, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    frame = np.broadcast_to(gradient, (height, width, 3)).copy()
+    frame += rng.normal(0, 6, (height, width, 3)).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_image(path, size, n_faces=1, face_image=None, seed=0):
+    """Grava uma imagem com rostos e retorna as caixas deles."""
+    frame = background(size, seed)
+    boxes = face_boxes(size, n_faces)
+    for box in boxes:
+        draw_face(frame, box, face_image=face_image)
+    cv2.imwrite(path, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    return boxes
+
+
+def make_video(path, size, duration, fps=30, n_faces=1, face_image=None, seed=0):
+    """Grava um vídeo com rostos em leve movimento e retorna as caixas de cada frame."""
+    base = background(size, seed)
+    n_frames = int(duration * fps)
+    frame_boxes = []
+    with FFmpegWriter(path, size, fps, preset='ultrafast', crf=18) as writer:
+        for frame_idx in range(n_frames):
+            t = frame_idx / fps
+            offset = (int(size[0] * 0.01 * np.sin(2 * np.pi * 0.5 * t)),
+                      int(size[1] * 0.01 * np.cos(2 * np.pi * 0.3 * t)))
+            boxes = face_boxes(size, n_faces, offset)
+            frame = base.copy()
+            for box in boxes:
+                draw_face(frame, box, mouth_open=0.5 + 0.5 * np.sin(2 * np.pi * 4 * t),
+                          face_image=face_image)
+            writer.write_frame(frame)
+            frame_boxes.append(boxes)
+    return frame_boxes
+
+
+def load_face_image(path):
+    """Carrega uma foto de rosto (fixture) em RGB."""
+    if path is None:
+        return None
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(f"Imagem de rosto não encontrada: {path}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
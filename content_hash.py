@@ -0,0 +1,36 @@
+import hashlib
+import json
+import os
+
+# Memoização por (caminho, tamanho, mtime) para não reler arquivos grandes
+_digest_memo = {}
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Calcula o SHA-256 do conteúdo de um arquivo, lendo em blocos."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _digest_memo:
+        return _digest_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(chunk_size), b''):
+            digest.update(block)
+
+    _digest_memo[memo_key] = digest.hexdigest()
+    return _digest_memo[memo_key]
+
+
+def content_key(path, params=None):
+    """Gera uma chave a partir do conteúdo do arquivo e de parâmetros extras."""
+    digest = hashlib.sha256(file_digest(path).encode())
+    if params:
+        digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def remember_digest(path, digest):
+    """Registra o SHA-256 já conhecido de um arquivo (ex.: calculado no upload)."""
+    stat = os.stat(path)
+    _digest_memo[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import numpy as np
+from content_hash import content_key
+from disk_cache import evict_lru
+
+
+class DetectionCache:
+    """Índice persistente de detecções de rostos, endereçado por conteúdo.
+
+    Para cada mídia (hash dos bytes + parâmetros do detector) guarda um
+    arquivo `.npy` int32 com shape (n_frames, n_faces, 4), no formato
+    (top, right, bottom, left) e `-1` onde o rosto não foi encontrado. Os
+    arquivos são abertos com memory-map, então consultar um vídeo longo não
+    carrega o índice inteiro na memória.
+
+    O tamanho total é limitado por `max_bytes`; ao ultrapassá-lo os
+    arquivos usados há mais tempo são removidos (LRU pelo mtime).
+    """
+
+    def __init__(self, cache_dir='cache/detections', max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, media_path, params=None):
+        """Gera a chave do cache para uma mídia e parâmetros de detecção."""
+        return content_key(media_path, params)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npy')
+
+    def load(self, key):
+        """Retorna o índice memory-mapped da chave, ou None se não existir."""
+        path = self._path(key)
+        try:
+            boxes = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        # Marcar como usado recentemente para a evicção LRU
+        os.utime(path, None)
+        return boxes
+
+    def store(self, key, frame_boxes):
+        """Grava as caixas de cada frame (listas indexadas pelo ID do rosto)."""
+        n_faces = max((len(boxes) for boxes in frame_boxes), default=0)
+        path = self._path(key)
+
+        # Escrever num arquivo temporário e renomear, para nunca expor um índice parcial
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        os.close(fd)
+        array = np.lib.format.open_memmap(
+            temp_path, mode='w+', dtype=np.int32, shape=(len(frame_boxes), n_faces, 4)
+        )
+        array[:] = -1
+        for frame_idx, boxes in enumerate(frame_boxes):
+            for face_id, box in enumerate(boxes):
+                if box is not None:
+                    array[frame_idx, face_id] = box
+        array.flush()
+        del array
+        os.replace(temp_path, path)
+
+        self._evict()
+        return self.load(key)
+
+    def _evict(self):
+        """Remove os índices menos usados até respeitar `max_bytes`."""
+        evict_lru(self.cache_dir, self.max_bytes)
+
+    def image_faces(self, image_path, params, detect):
+        """Rostos de uma imagem pelo índice; `detect()` só roda se ela ainda não estiver nele."""
+        cache_key = self.key(image_path, params)
+        cached_index = self.load(cache_key)
+        if cached_index is None:
+            cached_index = self.store(cache_key, [detect()])
+        return [box for box in boxes_at(cached_index, 0) if box is not None]
+
+    def first_frame_faces(self, video_path, params):
+        """Rostos do primeiro frame de um vídeo já indexado (None se não estiver)."""
+        cached_index = self.load(self.key(video_path, params))
+        if cached_index is None:
+            return None
+        return [box for box in boxes_at(cached_index, 0) if box is not None]
+
+
+def boxes_at(index, frame_idx):
+    """Converte uma linha do índice em lista de caixas (None se ausente)."""
+    if frame_idx >= len(index):
+        return []
+    return [
+        tuple(int(v) for v in box) if box[0] >= 0 else None
+        for box in index[frame_idx]
+    ]
+
+
+class CachedFaceBoxes:
+    """Reproduz um índice do cache com a mesma interface do FaceTracker."""
+
+    def __init__(self, index):
+        self.index = index
+        self.frame_idx = 0
+
+    def update(self, frame):
+        boxes = boxes_at(self.index, self.frame_idx)
+        self.frame_idx += 1
+        return boxes
+
+    def locate(self, frame, face_id):
+        boxes = self.update(frame)
+        if face_id < len(boxes):
+            return boxes[face_id]
+        return None
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# Precisão do alpha em ponto fixo: 256 equivale a 1.0
+ALPHA_ONE = 256
+
+
+class FaceBlender:
+    """Mistura rostos gerados de volta nos frames com máscaras em cache.
+
+    A máscara elíptica suavizada depende apenas do tamanho (h, w) da caixa
+    do rosto, então é calculada uma vez por tamanho e guardada num LRU de
+    até `max_masks` entradas. A mistura usa aritmética inteira (alpha em
+    ponto fixo de 8 bits, acumulação em uint16) e escreve diretamente na
+    região do rosto do frame, sem copiar o frame inteiro.
+    """
+
+    def __init__(self, max_masks=64, blur_kernel=19):
+        self.max_masks = max_masks
+        self.blur_kernel = blur_kernel
+        self._masks = OrderedDict()
+
+    def mask(self, height, width):
+        """Retorna o alpha (h, w, 1) uint16 em [0, 256] para uma caixa do tamanho dado."""
+        key = (height, width)
+        if key in self._masks:
+            self._masks.move_to_end(key)
+            return self._masks[key]
+
+        mask = np.zeros((height, width), dtype=np.float32)
+        cv2.ellipse(mask,
+                    center=(width // 2, height // 2),
+                    axes=(width // 3, height // 2),
+                    angle=0, startAngle=0, endAngle=360,
+                    color=1, thickness=-1)
+
+        # Aplicar feather à máscara
+        mask = cv2.GaussianBlur(mask, (self.blur_kernel, self.blur_kernel), 0)
+        alpha = np.round(mask * ALPHA_ONE).astype(np.uint16)[..., np.newaxis]
+
+        self._masks[key] = alpha
+        if len(self._masks) > self.max_masks:
+            self._masks.popitem(last=False)
+        return alpha
+
+    @staticmethod
+    def _mix(new_faces, originals, alpha):
+        """Calcula (novo * a + original * (256 - a) + 128) >> 8 em uint16."""
+        mixed = new_faces.astype(np.uint16)
+        mixed *= alpha
+        mixed += originals.astype(np.uint16) * (ALPHA_ONE - alpha)
+        mixed += ALPHA_ONE // 2
+        mixed >>= 8
+        return mixed.astype(np.uint8)
+
+    def blend_into(self, frame, new_face_region, face_location):
+        """Mistura um rosto no frame, alterando o frame no lugar."""
+        top, right, bottom, left = face_location
+        roi = frame[top:bottom, left:right]
+        roi[...] = self._mix(new_face_region, roi, self.mask(bottom - top, right - left))
+        return frame
+
+    def blend_batch(self, frames, new_face_regions, face_locations):
+        """Mistura vários rostos de uma vez, no lugar.
+
+        Entradas com caixas do mesmo tamanho compartilham a máscara e são
+        misturadas numa única operação vetorizada sobre as regiões empilhadas.
+        """
+        groups = {}
+        for idx, (top, right, bottom, left) in enumerate(face_locations):
+            groups.setdefault((bottom - top, right - left), []).append(idx)
+
+        for (height, width), indices in groups.items():
+            rois = [
+                frames[idx][face_locations[idx][0]:face_locations[idx][2],
+                            face_locations[idx][3]:face_locations[idx][1]]
+                for idx in indices
+            ]
+            mixed = self._mix(np.stack([new_face_regions[idx] for idx in indices]),
+                              np.stack(rois), self.mask(height, width))
+            for roi, blended in zip(rois, mixed):
+                roi[...] = blended
+
+        return frames
@@ -0,0 +1,78 @@
+import cv2
+import face_recognition
+
+from face_tracker import box_iou
+
+
+class FaceDetector:
+    """Detecção HOG numa cópia reduzida do frame, com busca restrita a ROIs.
+
+    O custo do HOG cresce com o número de pixels, então `detect` roda sobre
+    o frame reduzido por `scale` e converte as caixas de volta para a
+    resolução original. `detect_near` procura apenas numa região em volta
+    de cada caixa conhecida (ampliada por `roi_padding` do tamanho da caixa
+    em cada lado) e, se algum rosto não for reencontrado na sua ROI, refaz
+    a busca no frame inteiro.
+    """
+
+    def __init__(self, scale=0.5, roi_padding=0.5, upsample=1):
+        if not 0 < scale <= 1:
+            raise ValueError("A escala de detecção deve estar em (0, 1]")
+        self.scale = scale
+        self.roi_padding = roi_padding
+        self.upsample = upsample
+        self.full_searches = 0
+        self.roi_searches = 0
+
+    def params(self):
+        """Parâmetros que influenciam o resultado (usados como chave de cache)."""
+        return {'detector': 'hog', 'detect_scale': self.scale, 'roi_padding': self.roi_padding,
+                'upsample': self.upsample}
+
+    def _search(self, image, offset=(0, 0)):
+        """Detecta na imagem reduzida e retorna caixas na resolução original."""
+        if self.scale < 1:
+            size = (max(1, int(image.shape[1] * self.scale)), max(1, int(image.shape[0] * self.scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        top_offset, left_offset = offset
+        return [
+            (int(top / self.scale) + top_offset, int(right / self.scale) + left_offset,
+             int(bottom / self.scale) + top_offset, int(left / self.scale) + left_offset)
+            for top, right, bottom, left in face_recognition.face_locations(
+                image, number_of_times_to_upsample=self.upsample
+            )
+        ]
+
+    def _clip(self, box, frame_shape):
+        top, right, bottom, left = box
+        height, width = frame_shape[:2]
+        return (max(0, top), min(width, right), min(height, bottom), max(0, left))
+
+    def detect(self, frame):
+        """Busca rostos no frame inteiro."""
+        self.full_searches += 1
+        return [self._clip(box, frame.shape) for box in self._search(frame)]
+
+    def detect_near(self, frame, boxes):
+        """Busca rostos só em volta de `boxes`; volta ao frame inteiro se algum faltar."""
+        if not boxes:
+            return self.detect(frame)
+
+        height, width = frame.shape[:2]
+        detections = []
+        for top, right, bottom, left in boxes:
+            pad_y = int((bottom - top) * self.roi_padding)
+            pad_x = int((right - left) * self.roi_padding)
+            roi_top, roi_left = max(0, top - pad_y), max(0, left - pad_x)
+            roi = frame[roi_top:min(height, bottom + pad_y), roi_left:min(width, right + pad_x)]
+
+            self.roi_searches += 1
+            found = [self._clip(box, frame.shape) for box in self._search(roi, (roi_top, roi_left))]
+            if not found:
+                return self.detect(frame)
+
+            # ROIs de rostos próximos se sobrepõem: não repetir o mesmo rosto
+            for box in found:
+                if all(box_iou(box, other) < 0.5 for other in detections):
+                    detections.append(box)
+        return detections
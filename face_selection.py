@@ -0,0 +1,44 @@
+def face_assignments(face_id, audio_path):
+    """Normaliza a seleção de rostos aceita por `process_media`.
+
+    `face_id` pode ser:
+      - um inteiro: um único rosto, sincronizado com `audio_path`;
+      - um dicionário {face_id: áudio}: cada rosto com sua própria faixa;
+      - uma lista de dicionários com `face_id`, `audio_path` (opcional,
+        padrão `audio_path`) e `ranges` (opcional, lista de [início, fim]
+        em segundos do vídeo em que o rosto é sincronizado).
+
+    Retorna uma lista de dicionários {face_id, audio_path, ranges}. As
+    faixas de cada rosto devem estar alinhadas ao início do vídeo.
+    """
+    if isinstance(face_id, dict):
+        items = [{'face_id': key, 'audio_path': value} for key, value in face_id.items()]
+    elif isinstance(face_id, (list, tuple)):
+        items = [item if isinstance(item, dict) else {'face_id': item} for item in face_id]
+    else:
+        items = [{'face_id': face_id}]
+
+    if not items:
+        raise ValueError("Nenhum rosto selecionado")
+
+    assignments = []
+    for item in items:
+        ranges = item.get('ranges')
+        assignments.append({
+            'face_id': int(item['face_id']),
+            'audio_path': item.get('audio_path') or audio_path,
+            'ranges': [(float(start), float(end)) for start, end in ranges] if ranges else None,
+        })
+    return assignments
+
+
+def frame_ranges(ranges, fps):
+    """Converte intervalos em segundos para intervalos [início, fim) de frames."""
+    if ranges is None:
+        return None
+    return [(int(round(start * fps)), int(round(end * fps))) for start, end in ranges]
+
+
+def in_ranges(frame_idx, ranges):
+    """True se o frame está em algum dos intervalos (ou se não há intervalos)."""
+    return ranges is None or any(start <= frame_idx < end for start, end in ranges)
@@ -0,0 +1,195 @@
+import cv2
+import face_recognition
+
+
+def box_iou(box_a, box_b):
+    """Calcula a interseção sobre união entre duas caixas (top, right, bottom, left)."""
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_a = (box_a[2] - box_a[0]) * (box_a[1] - box_a[3])
+    area_b = (box_b[2] - box_b[0]) * (box_b[1] - box_b[3])
+    union = area_a + area_b - intersection
+
+    return intersection / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """Rastreia rostos ao longo de um vídeo sem detectar em todos os frames.
+
+    A detecção completa (`face_recognition.face_locations`) roda apenas em
+    keyframes, a cada `detect_interval` frames. Nos frames intermediários
+    cada rosto é seguido por template matching numa região em volta da
+    última posição conhecida; se a correlação cair abaixo de
+    `min_confidence`, uma nova detecção é feita imediatamente.
+
+    Cada rosto recebe um ID estável (a ordem em que foi detectado pela
+    primeira vez) e as detecções seguintes são associadas aos tracks por
+    IoU, de modo que o ID não muda quando os rostos trocam de ordem.
+
+    Com um `detector` (`FaceDetector`), as detecções rodam num frame
+    reduzido e, enquanto há rostos ativos, só em volta deles; a cada
+    `full_search_interval` frames a busca cobre o frame inteiro, para
+    encontrar rostos que entraram em cena.
+    """
+
+    def __init__(self, detect_interval=10, min_confidence=0.6, search_padding=0.5, iou_threshold=0.3,
+                 record=False, detector=None, full_search_interval=50):
+        self.detect_interval = max(1, int(detect_interval))
+        self.min_confidence = min_confidence
+        self.search_padding = search_padding
+        self.iou_threshold = iou_threshold
+        self.record = record
+        self.detector = detector
+        self.full_search_interval = max(1, int(full_search_interval))
+        self.reset()
+
+    def reset(self):
+        """Descarta todos os tracks (ex.: ao iniciar um novo vídeo)."""
+        self.tracks = []
+        self.frame_idx = 0
+        self.detections = 0
+        self.last_full_search = None
+        self.history = []
+
+    def params(self):
+        """Parâmetros que influenciam o resultado (usados como chave de cache)."""
+        params = {
+            'detector': 'hog',
+            'detect_interval': self.detect_interval,
+            'min_confidence': self.min_confidence,
+            'search_padding': self.search_padding,
+            'iou_threshold': self.iou_threshold,
+        }
+        if self.detector is not None:
+            params.update(self.detector.params(), full_search_interval=self.full_search_interval)
+        return params
+
+    def _detect(self, frame):
+        """Executa a detecção de rostos no frame (só em volta dos rostos ativos, se possível)."""
+        self.detections += 1
+        if self.detector is None:
+            return face_recognition.face_locations(frame)
+
+        active = [track['last_box'] for track in self.tracks if track['box'] is not None]
+        full_search_due = (self.last_full_search is None
+                           or self.frame_idx - self.last_full_search >= self.full_search_interval)
+        if full_search_due or not active:
+            self.last_full_search = self.frame_idx
+            return self.detector.detect(frame)
+
+        searches = self.detector.full_searches
+        detections = self.detector.detect_near(frame, active)
+        if self.detector.full_searches != searches:
+            # A ROI não encontrou algum rosto e a busca foi refeita no frame inteiro
+            self.last_full_search = self.frame_idx
+        return detections
+
+    def _clip_box(self, box, frame_shape):
+        top, right, bottom, left = box
+        height, width = frame_shape[:2]
+        return (max(0, top), min(width, right), min(height, bottom), max(0, left))
+
+    def _set_template(self, track, gray, box):
+        top, right, bottom, left = box
+        track['box'] = box
+        track['last_box'] = box
+        track['template'] = gray[top:bottom, left:right].copy()
+
+    def _track(self, track, gray):
+        """Localiza o rosto por template matching em volta da última posição."""
+        top, right, bottom, left = track['box']
+        template = track['template']
+        height, width = template.shape[:2]
+        if height == 0 or width == 0:
+            return None, 0.0
+
+        pad_y = int(height * self.search_padding)
+        pad_x = int(width * self.search_padding)
+        search_top = max(0, top - pad_y)
+        search_left = max(0, left - pad_x)
+        search_bottom = min(gray.shape[0], bottom + pad_y)
+        search_right = min(gray.shape[1], right + pad_x)
+
+        search = gray[search_top:search_bottom, search_left:search_right]
+        if search.shape[0] < height or search.shape[1] < width:
+            return None, 0.0
+
+        scores = cv2.matchTemplate(search, template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (x, y) = cv2.minMaxLoc(scores)
+
+        new_top = search_top + y
+        new_left = search_left + x
+        return (new_top, new_left + width, new_top + height, new_left), confidence
+
+    def _associate(self, gray, detections):
+        """Associa as detecções aos tracks existentes por IoU."""
+        unmatched = list(range(len(detections)))
+
+        # Associação gulosa pela maior IoU com a última posição conhecida
+        candidates = []
+        for track_id, track in enumerate(self.tracks):
+            for det_idx, detection in enumerate(detections):
+                iou = box_iou(track['last_box'], detection)
+                if iou >= self.iou_threshold:
+                    candidates.append((iou, track_id, det_idx))
+        candidates.sort(reverse=True)
+
+        matched_tracks = set()
+        for _, track_id, det_idx in candidates:
+            if track_id in matched_tracks or det_idx not in unmatched:
+                continue
+            matched_tracks.add(track_id)
+            unmatched.remove(det_idx)
+            self._set_template(self.tracks[track_id], gray, detections[det_idx])
+
+        # Tracks sem detecção correspondente ficam inativos até reaparecerem
+        for track_id, track in enumerate(self.tracks):
+            if track_id not in matched_tracks:
+                track['box'] = None
+
+        # Novos rostos recebem os próximos IDs, na ordem da detecção
+        for det_idx in unmatched:
+            track = {}
+            self._set_template(track, gray, detections[det_idx])
+            self.tracks.append(track)
+
+    def update(self, frame):
+        """Processa o próximo frame e retorna a caixa de cada track.
+
+        A lista retornada é indexada pelo ID do rosto; tracks que não foram
+        encontrados neste frame aparecem como `None`.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+
+        need_detection = self.frame_idx % self.detect_interval == 0 or not self.tracks
+        if not need_detection:
+            for track in self.tracks:
+                if track['box'] is None:
+                    continue
+                box, confidence = self._track(track, gray)
+                if box is None or confidence < self.min_confidence:
+                    need_detection = True
+                    break
+                track['box'] = self._clip_box(box, frame.shape)
+                track['last_box'] = track['box']
+
+        if need_detection:
+            detections = [self._clip_box(box, frame.shape) for box in self._detect(frame)]
+            self._associate(gray, detections)
+
+        self.frame_idx += 1
+        boxes = [track['box'] for track in self.tracks]
+        if self.record:
+            self.history.append(boxes)
+        return boxes
+
+    def locate(self, frame, face_id):
+        """Atualiza o rastreamento e retorna a caixa do rosto `face_id`, se houver."""
+        boxes = self.update(frame)
+        if face_id < len(boxes):
+            return boxes[face_id]
+        return None
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+
+
+def face_hash(face_region):
+    """Hash perceptual (dHash de 64 bits) de uma região de rosto."""
+    gray = cv2.cvtColor(face_region, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count('1')
+
+
+class FrameSkipper:
+    """Decide quando o resultado da última inferência pode ser reaproveitado.
+
+    A saída do modelo depende só do recorte do rosto e da janela de áudio.
+    Se o rosto do frame atual é quase idêntico ao da última inferência
+    (dHash a até `duplicate_threshold` bits, mesmo tamanho de caixa) e a
+    janela de áudio também — diferença média até `mel_tolerance`, ou as
+    duas janelas em silêncio —, o rosto gerado anteriormente é reutilizado.
+
+    `stats` conta frames inferidos e reaproveitados; `duplicate_threshold`
+    igual a None desabilita o reaproveitamento.
+    """
+
+    def __init__(self, duplicate_threshold=4, mel_tolerance=0.05, silence_threshold=-1.5):
+        self.duplicate_threshold = duplicate_threshold
+        self.mel_tolerance = mel_tolerance
+        self.silence_threshold = silence_threshold
+        self.reset()
+
+    def reset(self):
+        self._reference = None
+        self.last_output = None
+        self.stats = {
+            'frames_with_face': 0,
+            'inferred': 0,
+            'reused_duplicate': 0,
+            'reused_silent': 0,
+        }
+
+    def _is_silent(self, mel_window):
+        return self.silence_threshold is not None and float(np.mean(mel_window)) < self.silence_threshold
+
+    def check(self, face_region, mel_window):
+        """Retorna True se a última saída inferida pode ser usada neste frame.
+
+        Caso contrário, o frame passa a ser a nova referência e deve ser
+        inferido.
+        """
+        self.stats['frames_with_face'] += 1
+        if self.duplicate_threshold is None:
+            self.stats['inferred'] += 1
+            return False
+
+        current = {
+            'hash': face_hash(face_region),
+            'size': face_region.shape[:2],
+            'mel': mel_window,
+            'silent': self._is_silent(mel_window),
+        }
+
+        reference = self._reference
+        if reference is not None and reference['size'] == current['size'] \
+                and hamming_distance(reference['hash'], current['hash']) <= self.duplicate_threshold:
+            if reference['silent'] and current['silent']:
+                self.stats['reused_silent'] += 1
+                return True
+            if float(np.mean(np.abs(reference['mel'] - current['mel']))) <= self.mel_tolerance:
+                self.stats['reused_duplicate'] += 1
+                return True
+
+        self._reference = current
+        self.stats['inferred'] += 1
+        return False
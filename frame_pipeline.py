@@ -0,0 +1,132 @@
+import queue
+import threading
+
+import numpy as np
+
+# Marca o fim da sequência de itens entre estágios
+_END = object()
+
+# Intervalo (s) com que esperas bloqueantes conferem se o pipeline foi interrompido
+_POLL_INTERVAL = 0.1
+
+
+class PipelineStopped(Exception):
+    """Levantada nas esperas de um estágio quando outro estágio falhou."""
+
+
+class FrameRing:
+    """Slots de frames pré-alocados, reaproveitados ao longo do vídeo.
+
+    Os estágios trocam apenas o índice do slot; o frame em si é escrito uma
+    vez pelo decodificador, modificado no lugar e liberado pelo encoder.
+    Como `acquire` bloqueia enquanto todos os slots estão em uso, o número
+    de slots limita quantos frames podem estar em trânsito no pipeline.
+    """
+
+    def __init__(self, slots, frame_shape, dtype=np.uint8):
+        self.frames = np.empty((slots,) + tuple(frame_shape), dtype=dtype)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    def acquire(self, stop_event):
+        while True:
+            try:
+                return self._free.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if stop_event.is_set():
+                    raise PipelineStopped()
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def in_use(self):
+        return len(self.frames) - self._free.qsize()
+
+
+class StagePipeline:
+    """Estágios em threads ligados por filas limitadas.
+
+    Cada estágio é uma função `worker(items, emit)`: `items` itera sobre as
+    saídas do estágio anterior (None no primeiro estágio) e `emit(item)`
+    envia um item ao próximo. Filas cheias bloqueiam o estágio produtor
+    (backpressure), e a profundidade de cada fila é amostrada em
+    `metrics` (`queue_<estágio>`) a cada item enviado, com um contador
+    `backpressure_<estágio>` das vezes em que o produtor teve de esperar.
+    Se um estágio falhar, os demais são interrompidos e `run` relança o
+    erro na thread que o chamou.
+    """
+
+    def __init__(self, metrics, queue_size=16):
+        self.metrics = metrics
+        self.queue_size = max(1, int(queue_size))
+        self.stages = []
+        self.stop_event = threading.Event()
+        self.error = None
+
+    def add_stage(self, name, worker):
+        self.stages.append((name, worker))
+        return self
+
+    def _items(self, source):
+        while True:
+            try:
+                item = source.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    raise PipelineStopped()
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _emitter(self, target, name):
+        def emit(item):
+            if target is None:
+                return
+            self.metrics.observe(f'queue_{name}', target.qsize())
+            try:
+                target.put_nowait(item)
+                return
+            except queue.Full:
+                self.metrics.count(f'backpressure_{name}')
+            while True:
+                try:
+                    target.put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    if self.stop_event.is_set():
+                        raise PipelineStopped()
+        return emit
+
+    def _run_stage(self, worker, items, emit):
+        try:
+            worker(items, emit)
+            emit(_END)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+            self.stop_event.set()
+
+    def run(self):
+        """Executa todos os estágios até o fim da sequência ou até um erro."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages[1:]]
+        threads = []
+        for idx, (name, worker) in enumerate(self.stages):
+            source = queues[idx - 1] if idx > 0 else None
+            target = queues[idx] if idx < len(queues) else None
+            # A fila de saída recebe o nome do estágio que a consome
+            target_name = self.stages[idx + 1][0] if target is not None else None
+            items = self._items(source) if source is not None else None
+            thread = threading.Thread(target=self._run_stage, name=f'pipeline-{name}',
+                                      args=(worker, items, self._emitter(target, target_name)),
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+class ImageAnimator:
+    """Gera os frames de uma foto animada alterando só a região do rosto.
+
+    A imagem original é mantida uma única vez e serve como frame neutro
+    (boca fechada, sem inferência). Os frames falados reutilizam um único
+    buffer: a cada frame apenas a região do rosto é restaurada e a nova
+    boca é misturada nela, sem copiar a imagem inteira.
+    """
+
+    def __init__(self, image, face_location, blender):
+        top, right, bottom, left = face_location
+        self.image = np.ascontiguousarray(image)
+        self.face_location = face_location
+        self.blender = blender
+
+        # Buffer reutilizado por todos os frames falados
+        self.frame = self.image.copy()
+        self.roi = self.frame[top:bottom, left:right]
+        self.original_roi = self.image[top:bottom, left:right].copy()
+
+    def neutral_frame(self):
+        """Frame sem alteração, usado nas janelas de silêncio."""
+        return self.image
+
+    def render(self, new_face_region):
+        """Retorna o frame com a nova região do rosto (válido até a próxima chamada)."""
+        self.roi[...] = self.original_roi
+        return self.blender.blend_into(self.frame, new_face_region, self.face_location)
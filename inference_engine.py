@@ -0,0 +1,119 @@
+import numpy as np
+import tensorflow as tf
+
+
+class InferenceEngine:
+    """Executa o Wav2Lip como grafos `tf.function` de assinatura fixa.
+
+    Pré-processamento (uint8 -> [-1, 1]), forward pass e pós-processamento
+    ([-1, 1] -> uint8) rodam num único grafo. Os lotes são sempre do mesmo
+    tamanho (o último é completado com zeros), então cada função é traçada
+    uma única vez e nunca é retraçada. Com `jit_compile=True` os grafos
+    são compilados com XLA.
+    """
+
+    def __init__(self, model, batch_size=64, mel_window=16, mel_channels=80,
+                 jit_compile=False, warmup=True):
+        self.model = model
+        self.batch_size = batch_size
+        self.mel_window = mel_window
+        self.mel_channels = mel_channels
+
+        faces_spec = tf.TensorSpec((batch_size, 96, 96, 3), tf.uint8)
+        mels_spec = tf.TensorSpec((batch_size, mel_channels, mel_window, 1), tf.float32)
+        features_spec = tf.TensorSpec((batch_size,) + tuple(model.face_encoder.output_shape[1:]),
+                                      tf.float32)
+
+        self._predict = tf.function(self._predict_graph, input_signature=[faces_spec, mels_spec],
+                                    jit_compile=jit_compile)
+        self._encode = tf.function(self._encode_graph, input_signature=[faces_spec],
+                                   jit_compile=jit_compile)
+        self._decode = tf.function(self._decode_graph, input_signature=[features_spec, mels_spec],
+                                   jit_compile=jit_compile)
+
+        if warmup:
+            self.warmup()
+
+    @staticmethod
+    def _normalize(faces):
+        return tf.cast(faces, tf.float32) / 127.5 - 1.0
+
+    @staticmethod
+    def _denormalize(frames):
+        frames = (frames + 1.0) * 127.5
+        return tf.cast(tf.clip_by_value(tf.round(frames), 0, 255), tf.uint8)
+
+    def _predict_graph(self, faces, mels):
+        synced = self.model.model([self._normalize(faces), mels], training=False)
+        return self._denormalize(synced)
+
+    def _encode_graph(self, faces):
+        return self.model.face_encoder(self._normalize(faces), training=False)
+
+    def _decode_graph(self, face_features, mels):
+        encoded_audio = self.model.audio_encoder(mels, training=False)
+        synced = self.model.generator([face_features, encoded_audio], training=False)
+        return self._denormalize(synced)
+
+    def warmup(self):
+        """Traça (e compila) todos os grafos antes do primeiro job."""
+        faces = np.zeros((self.batch_size, 96, 96, 3), dtype=np.uint8)
+        mels = np.zeros((self.batch_size, self.mel_channels, self.mel_window, 1), dtype=np.float32)
+        features = self._encode(faces)
+        self._predict(faces, mels)
+        self._decode(features, mels)
+
+    def _pad(self, array):
+        """Completa o lote com zeros até `batch_size`."""
+        missing = self.batch_size - len(array)
+        if missing == 0:
+            return array
+        return np.concatenate([array, np.zeros((missing,) + array.shape[1:], dtype=array.dtype)])
+
+    def predict(self, faces, mels):
+        """Gera frames (N, 96, 96, 3) uint8 a partir de faces uint8 e janelas mel."""
+        faces = np.asarray(faces, dtype=np.uint8)
+        mels = np.asarray(mels, dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(faces), self.batch_size):
+            count = len(faces[start:start + self.batch_size])
+            synced = self._predict(self._pad(faces[start:start + self.batch_size]),
+                                   self._pad(mels[start:start + self.batch_size]))
+            outputs.append(synced.numpy()[:count])
+
+        if not outputs:
+            return np.zeros((0, 96, 96, 3), dtype=np.uint8)
+        return np.concatenate(outputs, axis=0)
+
+    def encode_face(self, faces):
+        """Codifica faces uint8 (N, 96, 96, 3) com o `face_encoder`."""
+        faces = np.asarray(faces, dtype=np.uint8)
+
+        outputs = []
+        for start in range(0, len(faces), self.batch_size):
+            count = len(faces[start:start + self.batch_size])
+            features = self._encode(self._pad(faces[start:start + self.batch_size]))
+            outputs.append(features.numpy()[:count])
+        return np.concatenate(outputs, axis=0)
+
+    def predict_from_encoded(self, face_features, mels):
+        """Executa encoder de áudio + gerador a partir de faces já codificadas."""
+        face_features = np.asarray(face_features, dtype=np.float32)
+        mels = np.asarray(mels, dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(mels), self.batch_size):
+            batch_mels = mels[start:start + self.batch_size]
+            count = len(batch_mels)
+            if len(face_features) == 1:
+                features = np.broadcast_to(face_features, (count,) + face_features.shape[1:])
+            else:
+                features = face_features[start:start + self.batch_size]
+
+            synced = self._decode(self._pad(np.ascontiguousarray(features)), self._pad(batch_mels))
+            outputs.append(synced.numpy()[:count])
+
+        if not outputs:
+            return np.zeros((0, 96, 96, 3), dtype=np.uint8)
+        return np.concatenate(outputs, axis=0)
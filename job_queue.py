@@ -0,0 +1,449 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+
+# Intervalo (s) entre os sinais de vida que cada worker grava no banco
+HEARTBEAT_INTERVAL = 5.0
+
+# Segundos sem sinal de vida até um worker (e os jobs que ele executava) ser dado como parado
+HEARTBEAT_TIMEOUT = 6 * HEARTBEAT_INTERVAL
+
+
+class JobQueue:
+    """Fila local de jobs de lipsync, persistida em SQLite.
+
+    Não depende de broker externo: o processo web e os workers
+    compartilham o mesmo arquivo de banco. A retirada de jobs usa
+    `BEGIN IMMEDIATE`, então vários workers podem consumir a fila sem
+    pegar o mesmo job duas vezes.
+
+    Jobs enviados com `result_key` (veja `result_cache.result_key`) são
+    deduplicados: um job idêntico já concluído ou em andamento é
+    devolvido no lugar de um novo, e seu resultado é servido do mesmo
+    arquivo. `evict_results` limita o espaço ocupado pelos resultados.
+
+    Os workers com o modelo carregado gravam um sinal de vida periódico
+    (`heartbeat`); `live_workers` informa quais estão ativos, o que serve
+    de readiness para o processo web.
+    """
+
+    def __init__(self, db_path='jobs.db'):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    media_path TEXT NOT NULL,
+                    audio_path TEXT NOT NULL,
+                    face_id TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    result_path TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    result_key TEXT,
+                    subscribers INTEGER NOT NULL DEFAULT 1,
+                    worker_id TEXT
+                )
+            ''')
+            # Bancos criados antes da deduplicação de resultados
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'result_key' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN result_key TEXT')
+            if 'subscribers' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN subscribers INTEGER NOT NULL DEFAULT 1')
+            if 'worker_id' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN worker_id TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_result_key ON jobs (result_key)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS workers (
+                    id TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    ready_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?',
+                         list(fields.values()) + [job_id])
+
+    def submit(self, media_path, audio_path, face_id=0, result_key=None):
+        """Enfileira um job e retorna seu ID.
+
+        Com `result_key`, um job com a mesma chave já concluído (com o
+        resultado ainda em disco) ou em andamento tem o ID devolvido em vez
+        de criar um novo job.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Verificação e inserção na mesma transação: envios simultâneos
+            # do mesmo job resultam num único job
+            conn.execute('BEGIN IMMEDIATE')
+            if result_key is not None:
+                existing = self._find_result(conn, result_key)
+                if existing is not None:
+                    conn.execute('UPDATE jobs SET subscribers = subscribers + ?, updated_at = ? WHERE id = ?',
+                                 (0 if existing['status'] == DONE else 1, now, existing['id']))
+                    conn.execute('COMMIT')
+                    return existing['id']
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO jobs (id, status, media_path, audio_path, face_id, created_at, updated_at, '
+                'result_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, QUEUED, media_path, audio_path, json.dumps(face_id), now, now, result_key)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return job_id
+
+    def _find_result(self, conn, result_key):
+        """Job reaproveitável com a chave: concluído com o arquivo presente, ou em andamento."""
+        rows = conn.execute(
+            'SELECT id, status, result_path FROM jobs '
+            'WHERE result_key = ? AND status IN (?, ?, ?) AND cancel_requested = 0 '
+            'ORDER BY created_at DESC',
+            (result_key, DONE, QUEUED, RUNNING)
+        ).fetchall()
+        for row in rows:
+            if row['status'] != DONE or os.path.exists(row['result_path']):
+                return row
+            # O arquivo foi removido por fora: o resultado não vale mais
+            conn.execute('UPDATE jobs SET status = ?, result_path = NULL WHERE id = ?',
+                         (EXPIRED, row['id']))
+        return None
+
+    def get(self, job_id):
+        """Retorna o job como dicionário, ou None se não existir."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['face_id'] = json.loads(job['face_id'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def claim(self, worker_id=None):
+        """Retira o job mais antigo da fila e o marca como em execução por `worker_id`."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('UPDATE jobs SET status = ?, worker_id = ?, updated_at = ? WHERE id = ?',
+                         (RUNNING, worker_id, time.time(), row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return self.get(row['id'])
+
+    def set_progress(self, job_id, progress):
+        self._update(job_id, progress=float(progress))
+
+    def finish(self, job_id, result_path):
+        self._update(job_id, status=DONE, progress=1.0, result_path=result_path)
+
+    def fail(self, job_id, error):
+        self._update(job_id, status=FAILED, error=error)
+
+    def mark_cancelled(self, job_id):
+        self._update(job_id, status=CANCELLED)
+
+    def cancel(self, job_id):
+        """Cancela um job: imediatamente se na fila, ou sinaliza o worker se em execução.
+
+        Um job compartilhado por envios idênticos só é cancelado quando
+        todos os que o aguardam desistem.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job['status'] in (QUEUED, RUNNING) and job['subscribers'] > 1:
+            self._update(job_id, subscribers=job['subscribers'] - 1)
+        elif job['status'] == QUEUED:
+            self.mark_cancelled(job_id)
+        elif job['status'] == RUNNING:
+            self._update(job_id, cancel_requested=1)
+        return self.get(job_id)
+
+    def count_by_status(self):
+        """Número de jobs em cada status."""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) AS total FROM jobs GROUP BY status').fetchall()
+        return {row['status']: row['total'] for row in rows}
+
+    def evict_results(self, max_bytes=None, max_age=None):
+        """Remove os resultados usados há mais tempo além do orçamento de espaço e idade.
+
+        Os resultados são ordenados pelo último uso (conclusão ou
+        reaproveitamento): os mais antigos que `max_age` segundos e todos os
+        que vêm depois de o total passar de `max_bytes` são apagados, e seus
+        jobs passam a `expired`. Retorna o número de resultados removidos.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Escolha e marcação das vítimas na mesma transação: um `submit`
+            # que reaproveite um resultado não o vê expirar depois de devolvê-lo
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                'SELECT id, result_path, updated_at FROM jobs WHERE status = ? ORDER BY updated_at DESC',
+                (DONE,)
+            ).fetchall()
+
+            total = 0
+            over_budget = False
+            victims = []
+            for row in rows:
+                try:
+                    size = os.path.getsize(row['result_path'])
+                except (OSError, TypeError):
+                    victims.append(row)
+                    continue
+                total += size
+                over_budget = over_budget or (max_bytes is not None and total > max_bytes)
+                if over_budget or (max_age is not None and now - row['updated_at'] > max_age):
+                    victims.append(row)
+
+            evicted = []
+            for row in victims:
+                cursor = conn.execute(
+                    'UPDATE jobs SET status = ?, result_path = NULL, updated_at = ? '
+                    'WHERE id = ? AND status = ? AND updated_at = ?',
+                    (EXPIRED, now, row['id'], DONE, row['updated_at'])
+                )
+                if cursor.rowcount:
+                    evicted.append(row['result_path'])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        # Só os arquivos de jobs efetivamente marcados como expirados são apagados
+        for result_path in evicted:
+            try:
+                os.remove(result_path)
+            except (FileNotFoundError, TypeError):
+                pass
+        return len(evicted)
+
+    def heartbeat(self, worker_id, started_at, ready_at):
+        """Registra que o worker está ativo, com o modelo carregado desde `ready_at`."""
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO workers (id, started_at, ready_at, heartbeat_at) '
+                         'VALUES (?, ?, ?, ?)', (worker_id, started_at, ready_at, time.time()))
+
+    def live_workers(self, max_age):
+        """Workers com sinal de vida nos últimos `max_age` segundos, mais recentes primeiro."""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT * FROM workers WHERE heartbeat_at >= ? ORDER BY ready_at DESC',
+                                (time.time() - max_age,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def forget_workers(self, max_age):
+        """Remove os registros de workers sem sinal de vida há mais de `max_age` segundos."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM workers WHERE heartbeat_at < ?', (time.time() - max_age,))
+
+    def requeue_stale(self, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        """Devolve à fila jobs em execução por workers que pararam.
+
+        Só são afetados os jobs cujo worker não deu sinal de vida nos
+        últimos `heartbeat_timeout` segundos (ou sem worker registrado):
+        jobs de workers ativos, inclusive de outros processos do app,
+        continuam com eles.
+        """
+        stale = ('status = ? AND (worker_id IS NULL OR worker_id NOT IN '
+                 '(SELECT id FROM workers WHERE heartbeat_at >= ?))')
+        limit = time.time() - heartbeat_timeout
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET status = ?, progress = 0, worker_id = NULL, updated_at = ? '
+                         f'WHERE {stale} AND cancel_requested = 0',
+                         (QUEUED, time.time(), RUNNING, limit))
+            conn.execute(f'UPDATE jobs SET status = ?, updated_at = ? '
+                         f'WHERE {stale} AND cancel_requested = 1',
+                         (CANCELLED, time.time(), RUNNING, limit))
+
+
+def run_job(queue, processor, job, result_dir):
+    """Executa um job já retirado da fila com o processador informado."""
+    # Importado aqui para que a fila possa ser usada sem carregar o modelo
+    from lipsync_processor import ProcessingCancelled
+
+    job_id = job['id']
+
+    def report_progress(done, total):
+        if queue.get(job_id)['cancel_requested']:
+            raise ProcessingCancelled(job_id)
+        if total:
+            queue.set_progress(job_id, min(done / total, 0.99))
+
+    try:
+        result_path = processor.process_media(job['media_path'], job['audio_path'],
+                                              job['face_id'], progress_callback=report_progress)
+        final_path = os.path.join(result_dir, f'{job_id}.mp4')
+        shutil.move(result_path, final_path)
+        queue.finish(job_id, final_path)
+    except ProcessingCancelled:
+        queue.mark_cancelled(job_id)
+    except Exception as e:
+        logger.exception(f"Erro no job {job_id}")
+        queue.fail(job_id, str(e))
+
+
+def worker_loop(db_path, processor_settings, result_dir, poll_interval=1.0, metrics_dir=None,
+                result_max_bytes=None, result_max_age=None):
+    """Loop de um processo worker: carrega o modelo uma vez e consome a fila.
+
+    Com `metrics_dir`, o snapshot acumulado das métricas do worker é
+    gravado em `worker-<pid>.json` após cada job, para o endpoint /metrics.
+    Após cada job, os resultados além de `result_max_bytes` ou mais
+    antigos que `result_max_age` segundos são removidos. Com o modelo
+    carregado, uma thread grava o sinal de vida do worker a cada
+    `HEARTBEAT_INTERVAL` segundos, inclusive durante jobs longos.
+    """
+    started_at = time.time()
+    from lipsync_processor import LipSyncProcessor
+    from pipeline_metrics import write_snapshot
+
+    queue = JobQueue(db_path)
+    processor = LipSyncProcessor.from_settings(processor_settings)
+    os.makedirs(result_dir, exist_ok=True)
+
+    worker_id = f'{socket.gethostname()}-{os.getpid()}'
+    ready_at = time.time()
+
+    def send_heartbeats():
+        while True:
+            try:
+                queue.heartbeat(worker_id, started_at, ready_at)
+            except sqlite3.Error:
+                logger.exception("Erro ao registrar o sinal de vida do worker")
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    # Primeiro sinal antes de pegar jobs: os jobs deste worker nunca parecem órfãos
+    queue.heartbeat(worker_id, started_at, ready_at)
+    threading.Thread(target=send_heartbeats, name='worker-heartbeat', daemon=True).start()
+
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(queue, processor, job, result_dir)
+        if result_max_bytes is not None or result_max_age is not None:
+            queue.evict_results(result_max_bytes, result_max_age)
+        if metrics_dir and processor.metrics.enabled:
+            write_snapshot(processor.metrics_snapshot(),
+                           os.path.join(metrics_dir, f'worker-{os.getpid()}.json'))
+
+
+class WorkerPool:
+    """Conjunto de processos worker consumindo uma `JobQueue` local.
+
+    `concurrency` limita quantos jobs rodam ao mesmo tempo neste nó; cada
+    worker mantém seu próprio `LipSyncProcessor` carregado e, com
+    `metrics_dir`, publica nele as suas métricas. `result_max_bytes` e
+    `result_max_age` definem o orçamento dos resultados guardados. Ao
+    iniciar, só voltam à fila os jobs de workers sem sinal de vida há mais
+    de `heartbeat_timeout` segundos.
+    """
+
+    def __init__(self, db_path, processor_settings, result_dir, concurrency=1, metrics_dir=None,
+                 result_max_bytes=None, result_max_age=None, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self.db_path = db_path
+        self.processor_settings = processor_settings
+        self.result_dir = result_dir
+        self.concurrency = max(1, int(concurrency))
+        self.metrics_dir = metrics_dir
+        self.result_max_bytes = result_max_bytes
+        self.result_max_age = result_max_age
+        self.heartbeat_timeout = heartbeat_timeout
+        self.processes = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Inicia os workers (idempotente e seguro entre threads)."""
+        with self._lock:
+            if not self.processes:
+                self._start_processes()
+
+    def _start_processes(self):
+        queue = JobQueue(self.db_path)
+        queue.requeue_stale(self.heartbeat_timeout)
+        queue.forget_workers(24 * 3600)
+
+        # Descartar snapshots de workers de execuções anteriores
+        if self.metrics_dir and os.path.isdir(self.metrics_dir):
+            for filename in os.listdir(self.metrics_dir):
+                if filename.startswith('worker-'):
+                    os.remove(os.path.join(self.metrics_dir, filename))
+
+        # 'spawn' evita herdar o estado do TensorFlow do processo pai
+        context = multiprocessing.get_context('spawn')
+        for _ in range(self.concurrency):
+            process = context.Process(
+                target=worker_loop,
+                args=(self.db_path, self.processor_settings, self.result_dir),
+                kwargs={'metrics_dir': self.metrics_dir,
+                        'result_max_bytes': self.result_max_bytes,
+                        'result_max_age': self.result_max_age},
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        logger.info(f"{self.concurrency} worker(s) de lipsync iniciados")
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
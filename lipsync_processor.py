@@ -1,24 +1,173 @@
 import cv2
 import numpy as np
-import tensorflow as tf
-import face_recognition
 from moviepy.editor import VideoFileClip, AudioFileClip
 import os
+import logging
 import tempfile
-from PIL import Image
+import itertools
+from collections import OrderedDict
 from audio_processor import AudioProcessor
 from wav2lip_model import Wav2LipModel
+from face_tracker import FaceTracker
+from face_detector import FaceDetector
+from face_blender import FaceBlender
+from image_animator import ImageAnimator
+from frame_analysis import FrameSkipper
+from frame_pipeline import FrameRing, StagePipeline
+from video_writer import FFmpegWriter, DEFAULT_ENCODE_OPTIONS
+from detection_cache import DetectionCache, CachedFaceBoxes
+from audio_cache import AudioFeatureCache
+from content_hash import content_key
+from face_selection import face_assignments, frame_ranges, in_ranges
+from pipeline_metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('keras', 'tflite-fp16', 'tflite-int8')
+
+
+class ProcessingCancelled(Exception):
+    """Levantada pelo callback de progresso para interromper um processamento."""
+
 
 class LipSyncProcessor:
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, batch_size=64, mel_window_frames=16, chunk_size=256,
+                 detect_interval=10, detection_cache=None, audio_cache=None,
+                 compiled=True, jit_compile=False, backend='keras', calibration_media=None,
+                 backend_dir=None, encode_options=None, silence_threshold=-1.5,
+                 duplicate_threshold=4, mel_tolerance=0.05, profile=False,
+                 detection_scale=0.5, roi_padding=0.5, pipelined=True):
         # Inicializar processadores
-        self.audio_processor = AudioProcessor()
+        self.audio_processor = AudioProcessor(feature_cache=audio_cache)
         self.model = Wav2LipModel()
+
+        # Número de frames por forward pass do modelo
+        self.batch_size = max(1, int(batch_size))
+
+        # Largura (em frames mel) da janela de áudio associada a cada frame
+        self.mel_window_frames = mel_window_frames
+
+        # Frames de vídeo mantidos em memória por vez ao processar vídeos
+        self.chunk_size = max(self.batch_size, int(chunk_size))
+
+        # Intervalo (em frames) entre detecções completas de rostos em vídeos
+        self.detect_interval = detect_interval
+
+        # Detecção HOG num frame reduzido por `detection_scale` e, entre
+        # buscas completas, só em volta dos rostos conhecidos (`roi_padding`)
+        self.face_detector = FaceDetector(scale=detection_scale, roi_padding=roi_padding)
+
+        # Índice persistente de detecções (DetectionCache), opcional
+        self.detection_cache = detection_cache
+
+        # Mistura dos rostos com máscaras em cache
+        self.blender = FaceBlender()
+
+        # Tempos por estágio e contadores (quase sem custo quando desligado)
+        self.metrics = PipelineMetrics(enabled=profile)
+
+        # Codificações de rostos de imagens, por (conteúdo da imagem, caixa)
+        self._face_encodings = OrderedDict()
+
+        # Decodificação, detecção, inferência e codificação em threads paralelas
+        self.pipelined = pipelined
+
+        # Parâmetros padrão do encoder (preset, crf, threads)
+        self.encode_options = dict(DEFAULT_ENCODE_OPTIONS, **(encode_options or {}))
+
+        # Janelas de áudio com log-mel médio abaixo deste valor são tratadas
+        # como silêncio e não passam pelo modelo (None desabilita)
+        self.silence_threshold = silence_threshold
+
+        # Reaproveitamento de inferências para frames quase idênticos (None desabilita)
+        self.duplicate_threshold = duplicate_threshold
+        self.mel_tolerance = mel_tolerance
         
         # Carregar pesos do modelo se fornecidos
         if model_path:
             self.model.load_weights(model_path)
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend não suportado: {backend}")
+
+        # Compilar a inferência em lote num grafo fixo (com aquecimento)
+        self.backend_parity = None
+        if backend != 'keras':
+            self._load_tflite_backend(backend, model_path, calibration_media, backend_dir)
+        elif compiled:
+            self.model.compile_inference(batch_size=self.batch_size,
+                                         mel_window=self.mel_window_frames,
+                                         jit_compile=jit_compile)
+
+        # Configuração serializável, usada para recriar o processador em outros processos
+        self.settings = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Cria um processador a partir de um dicionário serializável.
+
+        Além dos argumentos do construtor, aceita `cache_dir` (habilita os
+        caches de detecção e de áudio), `detection_cache_max_bytes` e
+        `audio_cache_max_bytes`.
+        """
+        settings = dict(settings)
+        cache_dir = settings.pop('cache_dir', None)
+        detection_max_bytes = settings.pop('detection_cache_max_bytes', 512 * 1024 * 1024)
+        audio_max_bytes = settings.pop('audio_cache_max_bytes', 1024 * 1024 * 1024)
+
+        if cache_dir:
+            settings['detection_cache'] = DetectionCache(
+                os.path.join(cache_dir, 'detections'), max_bytes=detection_max_bytes
+            )
+            settings['audio_cache'] = AudioFeatureCache(
+                os.path.join(cache_dir, 'audio'), max_bytes=audio_max_bytes
+            )
+
+        processor = cls(**settings)
+        processor.settings = dict(settings, cache_dir=cache_dir,
+                                  detection_cache_max_bytes=detection_max_bytes,
+                                  audio_cache_max_bytes=audio_max_bytes)
+        processor.settings.pop('detection_cache', None)
+        processor.settings.pop('audio_cache', None)
+        return processor
         
+    def _load_tflite_backend(self, backend, model_path, calibration_media, backend_dir):
+        """Exporta o modelo para TFLite quantizado e confere a paridade com o Keras."""
+        from tflite_backend import (TFLiteBackend, calibration_digest, collect_calibration_samples,
+                                    parity_check)
+
+        quantization = backend.split('-', 1)[1]
+        model_tag = content_key(model_path)[:16] if model_path else 'random'
+        calibration = None
+        if calibration_media and quantization == 'int8':
+            # Outros clipes de calibração geram outro modelo: o hash deles entra no nome,
+            # e as amostras só são extraídas se o modelo ainda não foi exportado
+            model_tag += '_cal' + calibration_digest(calibration_media)[:12]
+            calibration = lambda: collect_calibration_samples(self, calibration_media)
+
+        tflite = TFLiteBackend(
+            self.model,
+            batch_size=self.batch_size,
+            mel_window=self.mel_window_frames,
+            quantization=quantization,
+            calibration=calibration,
+            export_dir=backend_dir,
+            model_tag=model_tag
+        )
+
+        # Paridade medida nas amostras de calibração, se coletadas (ou em entradas aleatórias)
+        calibration = tflite.collected_calibration()
+        if calibration is not None:
+            faces, mels = calibration[0][:self.batch_size], calibration[1][:self.batch_size]
+        else:
+            faces = np.random.randint(0, 256, (self.batch_size, 96, 96, 3), dtype=np.uint8)
+            mels = np.random.randn(self.batch_size, self.audio_processor.mel_channels,
+                                   self.mel_window_frames, 1).astype(np.float32)
+        self.backend_parity = parity_check(self.model, tflite, faces, mels)
+        logger.info(f"Paridade {backend} x Keras: {self.backend_parity}")
+
+        self.model.use_backend(tflite)
+
     def _load_model(self):
         """Carrega o modelo Wav2Lip."""
         return self.model
@@ -42,134 +191,531 @@ class LipSyncProcessor:
 
     def _apply_lipsync(self, face_region, mel_features):
         """Aplica o lipsync em uma região do rosto."""
-        # Redimensionar face para 96x96 (tamanho esperado pelo modelo)
-        face_tensor = tf.image.resize(face_region, (96, 96))
-        
-        # Gerar face sincronizada
-        synced_face = self.model.predict(face_tensor, mel_features)
-        
-        # Redimensionar de volta ao tamanho original
-        synced_face = tf.image.resize(synced_face, (face_region.shape[0], face_region.shape[1]))
-        
-        return synced_face.numpy().astype(np.uint8)
+        return self._apply_lipsync_batch([face_region], [mel_features])[0]
+
+    def _apply_lipsync_batch(self, face_regions, mel_windows):
+        """Aplica o lipsync em várias regiões de rosto com inferência em lotes."""
+        if not face_regions:
+            return []
+
+        # Redimensionar cada face para 96x96 uma única vez
+        faces = np.stack([
+            cv2.resize(face, (96, 96), interpolation=cv2.INTER_AREA)
+            for face in face_regions
+        ])
+        mels = np.asarray(mel_windows)
+
+        with self.metrics.stage('inference'):
+            synced_faces = self.model.predict_batch(faces, mels, batch_size=self.batch_size)
+
+        # Redimensionar de volta ao tamanho original de cada região
+        return [
+            cv2.resize(synced, (face.shape[1], face.shape[0]), interpolation=cv2.INTER_LINEAR)
+            for synced, face in zip(synced_faces, face_regions)
+        ]
 
     def _blend_face(self, original_frame, new_face_region, face_location):
         """Mistura o rosto processado de volta no frame original."""
-        top, right, bottom, left = face_location
         result = original_frame.copy()
+        return self.blender.blend_into(result, new_face_region, face_location)
+
+    def _apply_lipsync_static(self, face_region, mel_windows, face_features=None):
+        """Aplica o lipsync numa mesma face para várias janelas de áudio.
+
+        A face é redimensionada e codificada uma única vez (ou usa
+        `face_features` já calculadas); por lote só rodam o encoder de
+        áudio e o gerador.
+        """
+        if len(mel_windows) == 0:
+            return []
+
+        if face_features is None:
+            face_features = self._encode_static_face(face_region)
+
+        with self.metrics.stage('inference'):
+            synced_faces = self.model.predict_from_encoded(
+                face_features, np.asarray(mel_windows), batch_size=self.batch_size
+            )
+
+        size = (face_region.shape[1], face_region.shape[0])
+        return [
+            cv2.resize(synced, size, interpolation=cv2.INTER_LINEAR)
+            for synced in synced_faces
+        ]
+
+    def _encode_static_face(self, face_region):
+        """Redimensiona e codifica uma região de rosto com o `face_encoder`."""
+        face = cv2.resize(face_region, (96, 96), interpolation=cv2.INTER_AREA)
+        with self.metrics.stage('inference'):
+            return self.model.encode_face(face[np.newaxis])
+
+    def _image_face_features(self, image_path, face_location, face_region, max_items=8):
+        """Codificação do rosto de uma imagem, reaproveitada entre jobs da mesma imagem."""
+        key = (content_key(image_path), tuple(face_location))
+        if key in self._face_encodings:
+            self._face_encodings.move_to_end(key)
+            return self._face_encodings[key]
+
+        face_features = self._encode_static_face(face_region)
+        self._face_encodings[key] = face_features
+        if len(self._face_encodings) > max_items:
+            self._face_encodings.popitem(last=False)
+        return face_features
+
+    def create_tracker(self, record=False):
+        """Cria o rastreador de rostos de vídeos com o detector configurado."""
+        return FaceTracker(detect_interval=self.detect_interval, record=record,
+                           detector=self.face_detector)
+
+    def detect_image_faces(self, image_path, image_rgb):
+        """Detecta os rostos de uma imagem, usando o índice persistente se houver."""
+        def detect():
+            with self.metrics.stage('face_detection'):
+                return self.face_detector.detect(image_rgb)
+
+        if self.detection_cache is None:
+            return detect()
+        return self.detection_cache.image_faces(image_path, self.face_detector.params(), detect)
+
+    def detect_video_faces(self, video_path, first_frame):
+        """Retorna os rostos do primeiro frame de um vídeo.
+
+        Se o vídeo já foi processado, os IDs vêm do índice persistente sem
+        nenhuma nova detecção; caso contrário só o primeiro frame é analisado.
+        """
+        if self.detection_cache is not None:
+            face_locations = self.detection_cache.first_frame_faces(
+                video_path, self.create_tracker().params()
+            )
+            if face_locations is not None:
+                return face_locations
+        with self.metrics.stage('face_detection'):
+            return self.face_detector.detect(first_frame)
+
+    def _locate_faces(self, frame, tracker):
+        """Localiza os rostos do frame (detecção em keyframes, rastreamento entre eles)."""
+        with self.metrics.stage('face_detection'):
+            return tracker.update(frame)
+
+    def _sync_chunk(self, chunk, fps, tracks):
+        """Sincroniza e mistura, no lugar, os rostos de um bloco de frames.
+
+        `chunk` é uma lista de (índice global, frame, caixas dos rostos) com
+        índices consecutivos. Todos os rostos selecionados (`tracks`) entram
+        no mesmo lote de inferência e na mesma passada de mistura. Retorna
+        os frames (cópias apenas dos que não eram graváveis).
+        """
+        frames = [frame for _, frame, _ in chunk]
+        windows_by_audio = {}
+        for track in tracks:
+            # Rostos com a mesma faixa de áudio compartilham as janelas
+            key = track['audio_path']
+            if key not in windows_by_audio:
+                windows_by_audio[key] = self.audio_processor.mel_windows(
+                    track['mel_features'], len(chunk), fps, self.mel_window_frames,
+                    start_frame=chunk[0][0]
+                )
+            track['chunk_windows'] = windows_by_audio[key]
+            track['reference_slot'] = -1  # -1: última saída do bloco anterior (skipper.last_output)
+
+        pending = []  # (posição no bloco, localização do rosto, faixa, índice da inferência ou -1)
+        face_regions = []
+        mel_windows = []
+        for position, (frame_idx, frame, face_locations) in enumerate(chunk):
+            for track in tracks:
+                face_id = track['face_id']
+                if face_id >= len(face_locations) or face_locations[face_id] is None:
+                    continue
+                if not in_ranges(frame_idx, track['frame_ranges']):
+                    continue
+                face_location = face_locations[face_id]
+
+                # Rosto e áudio quase iguais aos da última inferência: reaproveitar a saída
+                face_region = self._get_face_region(frame, face_location)
+                window = track['chunk_windows'][position]
+                if not track['skipper'].check(face_region, window):
+                    track['reference_slot'] = len(face_regions)
+                    face_regions.append(face_region)
+                    mel_windows.append(window)
+                pending.append((position, face_location, track, track['reference_slot']))
+
+        # Aplicar lipsync em lotes e misturar os rostos de volta nos frames, no lugar
+        inferred = self._apply_lipsync_batch(face_regions, mel_windows)
+        new_face_regions = [
+            inferred[slot] if slot >= 0 else track['skipper'].last_output
+            for _, _, track, slot in pending
+        ]
+        for track in tracks:
+            if track['reference_slot'] >= 0:
+                track['skipper'].last_output = inferred[track['reference_slot']]
+
+        for position, _, _, _ in pending:
+            if not frames[position].flags.writeable:
+                frames[position] = frames[position].copy()
+        with self.metrics.stage('blend'):
+            self.blender.blend_batch([frames[position] for position, _, _, _ in pending],
+                                     new_face_regions,
+                                     [face_location for _, face_location, _, _ in pending])
+        return frames
+
+    def _process_video_chunk(self, chunk, fps, tracks, tracker, writer):
+        """Detecta, sincroniza e mistura um bloco de frames e o envia ao writer."""
+        located = [(frame_idx, frame, self._locate_faces(frame, tracker)) for frame_idx, frame in chunk]
+        frames = self._sync_chunk(located, fps, tracks)
+
+        # Escrever os frames incrementalmente
+        with self.metrics.stage('encode'):
+            for frame in frames:
+                writer.write_frame(frame)
+
+    def face_tracks(self, assignments):
+        """Associa a cada rosto selecionado o espectrograma da sua faixa de áudio.
+
+        `assignments` vem de `face_assignments`; cada faixa de áudio
+        distinta é processada uma única vez.
+        """
+        mel_by_audio = {}
+        tracks = []
+        for assignment in assignments:
+            audio_path = assignment['audio_path']
+            if audio_path not in mel_by_audio:
+                with self.metrics.stage('audio_features'):
+                    mel_by_audio[audio_path] = self.audio_processor.extract_mel_features(audio_path)
+            tracks.append(dict(assignment, mel_features=mel_by_audio[audio_path]))
+        return tracks
+
+    def render_frames(self, frames, tracks, fps, tracker, writer,
+                      total_frames=0, progress_callback=None):
+        """Aplica o lipsync a uma sequência de frames e os envia ao writer.
+
+        `frames` é um iterável de (índice global do frame, frame RGB); o
+        índice global define a janela de áudio de cada frame, o que permite
+        processar apenas um trecho do vídeo. `tracks` (de `face_tracks`)
+        lista os rostos a sincronizar, cada um com seu áudio e, opcionalmente,
+        os intervalos em que é sincronizado. Os frames são agrupados em
+        blocos de `chunk_size` ou, com `pipelined`, passam por estágios em
+        threads paralelas (nesse caso `progress_callback` é chamado da thread
+        do encoder). Retorna as estatísticas de frames inferidos e
+        reaproveitados, somadas entre os rostos (também em `last_stats`).
+        """
+        tracks = [
+            dict(track,
+                 frame_ranges=frame_ranges(track.get('ranges'), fps),
+                 skipper=FrameSkipper(duplicate_threshold=self.duplicate_threshold,
+                                      mel_tolerance=self.mel_tolerance,
+                                      silence_threshold=self.silence_threshold))
+            for track in tracks
+        ]
+        if self.metrics.enabled:
+            frames = self._timed_frames(frames)
+        if self.pipelined:
+            frame_count = self._render_pipelined(frames, tracks, fps, tracker, writer,
+                                                 total_frames, progress_callback)
+        else:
+            frame_count = self._render_serial(frames, tracks, fps, tracker, writer,
+                                              total_frames, progress_callback)
+        if progress_callback:
+            progress_callback(total_frames, total_frames)
         
-        # Criar máscara para mesclagem suave
-        mask = np.zeros((bottom-top, right-left), dtype=np.float32)
-        cv2.ellipse(mask, 
-                   center=(mask.shape[1]//2, mask.shape[0]//2),
-                   axes=(mask.shape[1]//3, mask.shape[0]//2),
-                   angle=0, startAngle=0, endAngle=360,
-                   color=1, thickness=-1)
-        
-        # Aplicar feather à máscara
-        mask = cv2.GaussianBlur(mask, (19, 19), 0)
-        
-        # Expandir máscara para 3 canais
-        mask = np.expand_dims(mask, axis=-1)
-        
-        # Mesclar faces usando a máscara
-        result[top:bottom, left:right] = (
-            new_face_region * mask + 
-            original_frame[top:bottom, left:right] * (1 - mask)
-        ).astype(np.uint8)
+        self.last_stats = {'frames': frame_count}
+        for track in tracks:
+            for name, value in track['skipper'].stats.items():
+                self.last_stats[name] = self.last_stats.get(name, 0) + value
+        self._count_stats(self.last_stats)
+        logger.info(f"Frames inferidos/reaproveitados: {self.last_stats}")
+        return self.last_stats
+
+    def _render_serial(self, frames, tracks, fps, tracker, writer, total_frames, progress_callback):
+        """Processa os frames em blocos de `chunk_size`, um estágio após o outro."""
+        frame_count = 0
+        chunk = []
+        for frame_idx, frame in frames:
+            frame_count += 1
+            chunk.append((frame_idx, frame))
+            if len(chunk) >= self.chunk_size:
+                self._process_video_chunk(chunk, fps, tracks, tracker, writer)
+                if progress_callback:
+                    progress_callback(frame_idx + 1, total_frames)
+                chunk = []
         
-        return result
+        if chunk:
+            self._process_video_chunk(chunk, fps, tracks, tracker, writer)
+        return frame_count
+
+    def _render_pipelined(self, frames, tracks, fps, tracker, writer, total_frames, progress_callback):
+        """Processa os frames com decodificação, detecção, inferência e codificação em paralelo.
+
+        Cada estágio roda numa thread e os frames circulam por um anel de
+        `chunk_size` slots pré-alocados (`FrameRing`): o decodificador copia
+        cada frame para um slot livre, a mistura é feita no próprio slot e o
+        encoder o devolve ao anel. Com todos os slots em uso, o
+        decodificador espera, o que limita a memória como no modo serial.
+        A inferência agrupa `batch_size` frames por vez. Retorna o número de
+        frames processados.
+        """
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return 0
+
+        ring = FrameRing(self.chunk_size, first[1].shape, first[1].dtype)
+        pipeline = StagePipeline(self.metrics, queue_size=self.batch_size)
+        frame_count = 0
+
+        def decode(_, emit):
+            nonlocal frame_count
+            for frame_idx, frame in itertools.chain([first], frames):
+                slot = ring.acquire(pipeline.stop_event)
+                ring.frames[slot] = frame
+                frame_count += 1
+                emit((frame_idx, slot))
+
+        def detect(items, emit):
+            for frame_idx, slot in items:
+                emit((frame_idx, slot, self._locate_faces(ring.frames[slot], tracker)))
+
+        def sync(items, emit):
+            batch = []
+            for item in items:
+                # Frames fora de sequência não compartilham janelas de áudio
+                if batch and item[0] != batch[-1][0] + 1:
+                    self._sync_slots(batch, ring, fps, tracks, emit)
+                    batch = []
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._sync_slots(batch, ring, fps, tracks, emit)
+                    batch = []
+            if batch:
+                self._sync_slots(batch, ring, fps, tracks, emit)
+
+        def encode(items, _):
+            written = 0
+            for frame_idx, slot in items:
+                with self.metrics.stage('encode'):
+                    writer.write_frame(ring.frames[slot])
+                ring.release(slot)
+                written += 1
+                if progress_callback and written % self.chunk_size == 0:
+                    progress_callback(frame_idx + 1, total_frames)
 
-    def process_video(self, video_path, audio_path, face_id=0):
-        """Processa um vídeo com lipsync."""
-        # Carregar vídeo e áudio
+        pipeline.add_stage('decode', decode)
+        pipeline.add_stage('detect', detect)
+        pipeline.add_stage('sync', sync)
+        pipeline.add_stage('encode', encode)
+        pipeline.run()
+        return frame_count
+
+    def _sync_slots(self, batch, ring, fps, tracks, emit):
+        """Sincroniza um lote de slots do anel no lugar e os envia ao encoder."""
+        self._sync_chunk([(frame_idx, ring.frames[slot], boxes) for frame_idx, slot, boxes in batch],
+                         fps, tracks)
+        for frame_idx, slot, _ in batch:
+            emit((frame_idx, slot))
+
+    def _timed_frames(self, frames):
+        """Repassa os frames medindo o tempo de decodificação de cada um."""
+        iterator = iter(frames)
+        while True:
+            with self.metrics.stage('decode'):
+                item = next(iterator, None)
+            if item is None:
+                return
+            yield item
+
+    def _count_stats(self, stats):
+        for name, value in stats.items():
+            self.metrics.count(name, value)
+
+    def _caches(self):
+        return (('detection_cache', self.detection_cache),
+                ('audio_cache', self.audio_processor.feature_cache))
+
+    def reset_metrics(self):
+        """Zera as métricas e os contadores de acertos dos caches."""
+        self.metrics.reset()
+        for _, cache in self._caches():
+            if cache is not None:
+                cache.hits = cache.misses = 0
+
+    def metrics_snapshot(self):
+        """Snapshot das métricas, incluindo acertos e falhas dos caches."""
+        snapshot = self.metrics.snapshot()
+        for name, cache in self._caches():
+            if cache is not None:
+                snapshot['counters'][f'{name}_hits'] = cache.hits
+                snapshot['counters'][f'{name}_misses'] = cache.misses
+        return snapshot
+
+    def create_writer(self, output_path, size, fps, audio_path=None, encode_options=None):
+        """Cria o writer de saída com as opções de codificação do job."""
+        options = dict(self.encode_options, **(encode_options or {}))
+        return FFmpegWriter(output_path, size, fps, audio_path=audio_path, **options)
+
+    def process_video(self, video_path, audio_path, face_id=0, progress_callback=None,
+                      encode_options=None):
+        """Processa um vídeo com lipsync.
+
+        Os frames são lidos sob demanda e processados em blocos de
+        `chunk_size`, de modo que o pico de memória depende do tamanho do
+        bloco e não da duração do vídeo. `progress_callback(feitos, total)`
+        é chamado após cada bloco. Os frames vão direto para o ffmpeg, que
+        também multiplexa `audio_path`.
+
+        `face_id` pode selecionar vários rostos, cada um com sua faixa de
+        áudio e intervalos (veja `face_assignments`); todos são detectados,
+        sincronizados e misturados na mesma passada de decodificação e
+        codificação.
+        """
+        tracks = self.face_tracks(face_assignments(face_id, audio_path))
+
+        # Carregar vídeo
         video = VideoFileClip(video_path)
-        audio = AudioFileClip(audio_path)
-        
-        # Extrair características do áudio
-        mel_features = self._extract_audio_features(audio_path)
+        fps = video.fps if video.fps else 30
+        total_frames = int(video.duration * fps) if video.duration else 0
         
         # Criar arquivo temporário para o resultado
         with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_output:
             output_path = temp_output.name
         
-        # Processar cada frame
-        processed_frames = []
-        for frame in video.iter_frames():
-            # Detectar rostos
-            face_locations = face_recognition.face_locations(frame)
-            
-            if len(face_locations) > face_id:
-                face_location = face_locations[face_id]
-                face_region = self._get_face_region(frame, face_location)
-                
-                # Aplicar lipsync
-                new_face_region = self._apply_lipsync(face_region, mel_features)
-                
-                # Misturar o rosto processado de volta no frame
-                processed_frame = self._blend_face(frame, new_face_region, face_location)
-                processed_frames.append(processed_frame)
-            else:
-                processed_frames.append(frame)
-        
-        # Criar vídeo final
-        fps = video.fps if video.fps else 30
-        output_video = VideoFileClip(processed_frames, fps=fps)
-        final_video = output_video.set_audio(audio)
-        final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
+        # Reaproveitar as detecções de um processamento anterior da mesma mídia
+        tracker = self.create_tracker(record=self.detection_cache is not None)
+        cache_key = None
+        if self.detection_cache is not None:
+            cache_key = self.detection_cache.key(video_path, tracker.params())
+            cached_index = self.detection_cache.load(cache_key)
+            if cached_index is not None:
+                tracker = CachedFaceBoxes(cached_index)
+        
+        writer = self.create_writer(output_path, video.size, fps, audio_path, encode_options)
+        completed = False
+        try:
+            self.render_frames(enumerate(video.iter_frames()), tracks, fps,
+                               tracker, writer, total_frames, progress_callback)
+            completed = True
+        finally:
+            writer.close()
+            video.close()
+            # Não deixar arquivos temporários para trás (ex.: cancelamento)
+            if not completed:
+                os.remove(output_path)
+        
+        if cache_key is not None and isinstance(tracker, FaceTracker):
+            self.detection_cache.store(cache_key, tracker.history)
         
         return output_path
 
-    def process_image(self, image_path, audio_path, face_id=0):
-        """Processa uma imagem estática com lipsync."""
+    def process_image(self, image_path, audio_path, face_id=0, progress_callback=None,
+                      encode_options=None):
+        """Processa uma imagem estática com lipsync.
+
+        Apenas a região do rosto é regenerada a cada frame; janelas de
+        silêncio reaproveitam a imagem original sem passar pelo modelo, e
+        os frames seguem para o encoder em blocos de `chunk_size`. Fora dos
+        intervalos do rosto (se houver) a imagem fica neutra.
+        """
+        assignments = face_assignments(face_id, audio_path)
+        if len(assignments) > 1:
+            raise ValueError("Vários rostos por processamento só são suportados em vídeos")
+        face_id = assignments[0]['face_id']
+
         # Carregar imagem
         image = cv2.imread(image_path)
         image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
         # Detectar rostos
-        face_locations = face_recognition.face_locations(image_rgb)
+        face_locations = self.detect_image_faces(image_path, image_rgb)
         
         if len(face_locations) <= face_id:
             raise ValueError("Face ID não encontrado na imagem")
         
-        # Extrair características do áudio
-        mel_features = self._extract_audio_features(audio_path)
+        # Extrair características do áudio do rosto
+        mel_features = self.face_tracks(assignments)[0]['mel_features']
+        active_ranges = frame_ranges(assignments[0]['ranges'], 30)
         
         # Processar frames
         face_location = face_locations[face_id]
         face_region = self._get_face_region(image_rgb, face_location)
         
         # Criar frames para o vídeo
-        processed_frames = []
         audio_duration = AudioFileClip(audio_path).duration
         n_frames = int(audio_duration * 30)  # 30 fps
         
-        for i in range(n_frames):
-            # Aplicar lipsync com o frame atual do áudio
-            current_mel = mel_features[:, :, i:i+1, :]
-            new_face_region = self._apply_lipsync(face_region, current_mel)
-            
-            # Misturar o rosto processado de volta na imagem
-            processed_frame = self._blend_face(image_rgb, new_face_region, face_location)
-            processed_frames.append(processed_frame)
-        
         # Criar arquivo temporário para o resultado
         with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_output:
             output_path = temp_output.name
         
-        # Criar vídeo final
-        output_video = VideoFileClip(processed_frames, fps=30)
-        audio = AudioFileClip(audio_path)
-        final_video = output_video.set_audio(audio)
-        final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
+        # Só a região do rosto muda: o fundo é mantido e a face codificada uma única vez
+        animator = ImageAnimator(image_rgb, face_location, self.blender)
+        face_features = self._image_face_features(image_path, face_location, face_region)
+        silent_frames = 0
         
+        height, width = image_rgb.shape[:2]
+        completed = False
+        try:
+            with self.create_writer(output_path, (width, height), 30, audio_path,
+                                    encode_options) as writer:
+                for start in range(0, n_frames, self.chunk_size):
+                    count = min(self.chunk_size, n_frames - start)
+                    mel_windows = self.audio_processor.mel_windows(
+                        mel_features, count, 30, self.mel_window_frames, start_frame=start
+                    )
+                    
+                    # Janelas de silêncio reutilizam o frame neutro, sem inferência
+                    silent = self.audio_processor.silent_windows(mel_windows, self.silence_threshold)
+                    if active_ranges is not None:
+                        silent |= ~np.array([in_ranges(idx, active_ranges)
+                                             for idx in range(start, start + count)])
+                    new_face_regions = iter(self._apply_lipsync_static(
+                        face_region, mel_windows[~silent], face_features
+                    ))
+                    silent_frames += int(silent.sum())
+                    
+                    # Enviar os frames ao encoder à medida que são gerados
+                    for is_silent in silent:
+                        if is_silent:
+                            frame = animator.neutral_frame()
+                        else:
+                            with self.metrics.stage('blend'):
+                                frame = animator.render(next(new_face_regions))
+                        with self.metrics.stage('encode'):
+                            writer.write_frame(frame)
+                    
+                    if progress_callback:
+                        progress_callback(start + count, n_frames)
+            completed = True
+        finally:
+            if not completed:
+                os.remove(output_path)
+        
+        self.last_stats = {
+            'frames': n_frames,
+            'frames_with_face': n_frames,
+            'inferred': n_frames - silent_frames,
+            'reused_silent': silent_frames,
+        }
+        self._count_stats(self.last_stats)
+        logger.info(f"Frames inferidos/reaproveitados: {self.last_stats}")
         return output_path
 
-    def process_media(self, media_path, audio_path, face_id=0):
-        """Processa mídia (vídeo ou imagem) com lipsync."""
+    def process_media(self, media_path, audio_path, face_id=0, progress_callback=None,
+                      encode_options=None):
+        """Processa mídia (vídeo ou imagem) com lipsync.
+
+        `progress_callback(feitos, total)` é chamado periodicamente e pode
+        levantar `ProcessingCancelled` para interromper o processamento.
+        `encode_options` (preset, crf, threads) sobrepõe as opções padrão
+        do encoder só para este job. `face_id` é um índice de rosto ou uma
+        seleção de vários rostos com seus áudios e intervalos (veja
+        `face_assignments`); `audio_path` é sempre o áudio do resultado.
+        """
         if media_path.lower().endswith(('.mp4')):
-            return self.process_video(media_path, audio_path, face_id)
+            process = self.process_video
         elif media_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-            return self.process_image(media_path, audio_path, face_id)
+            process = self.process_image
         else:
             raise ValueError("Formato de arquivo não suportado")
+
+        with self.metrics.stage('total'):
+            result_path = process(media_path, audio_path, face_id, progress_callback, encode_options)
+        self.metrics.count('jobs')
+        return result_path
@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from content_hash import file_digest
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def probe_media(path):
+    """Retorna tipo, resolução e, para vídeos, fps e duração da mídia."""
+    import cv2
+
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError("Não foi possível ler a imagem")
+        return {'kind': 'image', 'width': image.shape[1], 'height': image.shape[0]}
+
+    # ffprobe lê só os cabeçalhos; sem ele, o OpenCV abre o vídeo sem decodificar frames
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe is not None:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height,avg_frame_rate:format=duration',
+             '-of', 'json', path],
+            capture_output=True, text=True
+        )
+        if result.returncode == 0:
+            data = json.loads(result.stdout)
+            if data.get('streams'):
+                stream = data['streams'][0]
+                numerator, _, denominator = stream.get('avg_frame_rate', '0/1').partition('/')
+                fps = float(numerator) / float(denominator) if float(denominator or 0) else 0.0
+                return {
+                    'kind': 'video',
+                    'width': int(stream['width']),
+                    'height': int(stream['height']),
+                    'fps': fps,
+                    'duration': float(data.get('format', {}).get('duration', 0) or 0),
+                }
+
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Não foi possível ler o vídeo")
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        return {
+            'kind': 'video',
+            'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': fps,
+            'duration': frame_count / fps if fps else 0.0,
+        }
+    finally:
+        capture.release()
+
+
+def working_size(width, height, max_side):
+    """Tamanho reduzido (lados pares) para que o maior lado caiba em `max_side`.
+
+    Retorna None se a mídia já cabe ou se `max_side` for 0/None.
+    """
+    if not max_side or max(width, height) <= max_side:
+        return None
+    scale = max_side / max(width, height)
+    return (max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2))
+
+
+def downscale_image(source_path, output_path, size):
+    import cv2
+
+    image = cv2.imread(source_path, cv2.IMREAD_UNCHANGED)
+    cv2.imwrite(output_path, cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+    return output_path
+
+
+def downscale_video(source_path, output_path, size, preset='veryfast', crf=18):
+    """Reduz o vídeo com o ffmpeg; o áudio é descartado (o job usa o áudio enviado)."""
+    from moviepy.config import get_setting
+
+    width, height = size
+    subprocess.run(
+        [get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-i', source_path,
+         '-vf', f'scale={width}:{height}:flags=area', '-an',
+         '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+         output_path],
+        check=True
+    )
+    return output_path
+
+
+def prepare_media(path, max_side):
+    """Reduz mídias maiores que a resolução de trabalho antes do processamento.
+
+    Retorna o caminho a usar no pipeline (o original, se já couber) e as
+    informações da mídia original. Assim nenhum estágio decodifica frames
+    4K só para recortar um rosto de 96x96. A versão reduzida é nomeada
+    pelo conteúdo da original, então reenvios do mesmo arquivo reaproveitam
+    a mesma versão (e chegam à mesma chave de resultado).
+    """
+    info = probe_media(path)
+    size = working_size(info['width'], info['height'], max_side)
+    if size is None:
+        return path, info
+
+    extension = os.path.splitext(path)[1]
+    base = os.path.join(os.path.dirname(path), file_digest(path)[:32])
+    output_path = f'{base}_{size[0]}x{size[1]}{extension}'
+    if not os.path.exists(output_path):
+        logger.info(f"Reduzindo {path} de {info['width']}x{info['height']} para {size[0]}x{size[1]}")
+        # Temporário único: análises simultâneas do mesmo arquivo (no mesmo
+        # processo ou não) nunca escrevem no mesmo arquivo
+        fd, temp_path = tempfile.mkstemp(suffix=extension, dir=os.path.dirname(output_path))
+        os.close(fd)
+        try:
+            if info['kind'] == 'image':
+                downscale_image(path, temp_path, size)
+            else:
+                downscale_video(path, temp_path, size)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    return output_path, dict(info, working_width=size[0], working_height=size[1])
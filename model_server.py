@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.environ.get('LIPSYNC_SOCKET', '/tmp/lipsync.sock')
+
+# Configurações enviadas a cada job em vez de fixadas ao iniciar o daemon
+PER_JOB_SETTINGS = frozenset({'encode_options', 'profile'})
+
+# Configurações com caminhos, comparadas como caminhos absolutos
+PATH_SETTINGS = ('model_path', 'cache_dir', 'backend_dir')
+
+
+def comparable_settings(settings):
+    """Configurações do processador normalizadas para comparar cliente e daemon."""
+    settings = {name: value for name, value in settings.items() if name not in PER_JOB_SETTINGS}
+    for name in PATH_SETTINGS:
+        if settings.get(name):
+            settings[name] = os.path.abspath(settings[name])
+    if settings.get('calibration_media'):
+        settings['calibration_media'] = [os.path.abspath(path) for path in settings['calibration_media']]
+    # Mesma representação dos dois lados do socket (tuplas viram listas etc.)
+    return json.loads(json.dumps(settings))
+
+
+def settings_mismatch(server_settings, client_settings):
+    """Nomes das configurações que diferem entre o daemon e o cliente."""
+    server_settings = comparable_settings(server_settings)
+    client_settings = comparable_settings(client_settings)
+    return sorted(name for name in set(server_settings) | set(client_settings)
+                  if server_settings.get(name) != client_settings.get(name))
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """Atende uma requisição JSON por conexão (uma linha de entrada, uma de saída)."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return  # conexão só testada (`socket_in_use`), sem requisição
+        try:
+            request = json.loads(line)
+            response = self.server.handle_request_data(request)
+        except Exception as e:
+            logger.exception("Erro ao processar requisição")
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Daemon que mantém um `LipSyncProcessor` carregado entre execuções.
+
+    Escuta num socket Unix e processa os jobs um por vez, reaproveitando o
+    grafo Keras e os pesos já carregados. O protocolo é uma linha JSON por
+    conexão, tanto na requisição quanto na resposta. Cada conexão é
+    atendida na sua própria thread, de modo que `ping` responde mesmo
+    durante um job longo; os jobs em si são serializados por um lock.
+
+    Jobs enviados com configurações diferentes das usadas ao iniciar o
+    daemon (exceto as de `PER_JOB_SETTINGS`) são recusados com erro.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, processor_settings, socket_path=DEFAULT_SOCKET_PATH):
+        # Outro daemon ativo no mesmo socket: recusar antes de carregar o modelo
+        if socket_in_use(socket_path):
+            raise RuntimeError(f"Já existe um servidor de modelo escutando em {socket_path}")
+
+        # Importado aqui para que o cliente não precise carregar o TensorFlow
+        from lipsync_processor import LipSyncProcessor
+
+        self.socket_path = socket_path
+        self.settings = dict(processor_settings)
+        self.processor = LipSyncProcessor.from_settings(processor_settings)
+        self._job_lock = threading.Lock()
+        self._socket_id = None
+
+        # Remover um socket antigo deixado por um daemon encerrado
+        if os.path.exists(socket_path) and not socket_in_use(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _JobHandler)
+
+    def server_bind(self):
+        super().server_bind()
+        # Identifica o arquivo do socket criado por este daemon
+        stat = os.stat(self.socket_path)
+        self._socket_id = (stat.st_dev, stat.st_ino)
+
+    def handle_request_data(self, request):
+        if request.get('command') == 'ping':
+            return {'ok': True}
+
+        if request.get('settings') is not None:
+            mismatch = settings_mismatch(self.settings, request['settings'])
+            if mismatch:
+                return {'ok': False, 'error': (
+                    f"O servidor de modelo foi iniciado com outras configurações "
+                    f"({', '.join(mismatch)}); reinicie-o com as mesmas opções ou use --no-daemon"
+                )}
+
+        with self._job_lock:
+            result_path = self.processor.process_media(
+                request['media_path'], request['audio_path'], request.get('face_id', 0),
+                encode_options=request.get('encode_options')
+            )
+        output_path = request.get('output_path') or result_path
+        if result_path != output_path:
+            shutil.move(result_path, output_path)
+        return {'ok': True, 'output_path': output_path}
+
+    def serve(self):
+        logger.info(f"Servidor de modelo aguardando jobs em {self.socket_path}")
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            self.remove_socket()
+
+    def remove_socket(self):
+        """Remove o arquivo do socket, se ainda for o criado por este daemon."""
+        try:
+            stat = os.stat(self.socket_path)
+        except FileNotFoundError:
+            return
+        if (stat.st_dev, stat.st_ino) == self._socket_id:
+            os.remove(self.socket_path)
+
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+    """Envia uma requisição ao daemon e retorna a resposta.
+
+    Levanta `ConnectionError`/`FileNotFoundError` se não houver daemon
+    escutando no socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b'\n')
+        with client.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("O servidor de modelo encerrou a conexão")
+    return json.loads(line)
+
+
+def socket_in_use(socket_path=DEFAULT_SOCKET_PATH):
+    """Verifica se algum processo aceita conexões no socket.
+
+    Ao contrário de `is_running`, não espera resposta: um daemon ocupado
+    conta como ativo, e só um socket que recusa conexões é considerado
+    abandonado.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+def is_running(socket_path=DEFAULT_SOCKET_PATH):
+    """Verifica se há um daemon respondendo no socket."""
+    try:
+        return send_request({'command': 'ping'}, socket_path, timeout=2).get('ok', False)
+    except (OSError, ValueError):
+        return False
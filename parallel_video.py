@@ -0,0 +1,248 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import face_recognition
+from moviepy.config import get_setting
+from moviepy.editor import VideoFileClip
+
+from face_detector import FaceDetector
+from detection_cache import CachedFaceBoxes
+from face_selection import face_assignments
+from video_writer import COPYABLE_AUDIO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Processador carregado uma única vez em cada processo do pool
+_worker_processor = None
+
+# Distância máxima entre codificações para considerar que são o mesmo rosto
+FACE_MATCH_TOLERANCE = 0.6
+
+
+def find_keyframes(video_path):
+    """Retorna os instantes (s) dos keyframes do vídeo, via ffprobe.
+
+    Se o ffprobe não estiver disponível, retorna uma lista vazia e os
+    segmentos são divididos uniformemente (a busca continua exata, só fica
+    mais cara).
+    """
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe is None:
+        return []
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+         '-show_entries', 'frame=best_effort_timestamp_time', '-of', 'csv=p=0', video_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return []
+
+    times = []
+    for line in result.stdout.splitlines():
+        line = line.strip().strip(',')
+        if line and line != 'N/A':
+            times.append(float(line))
+    return times
+
+
+def plan_segments(n_frames, fps, keyframe_times, n_segments):
+    """Divide [0, n_frames) em até `n_segments` trechos começando em keyframes."""
+    keyframes = sorted({int(round(t * fps)) for t in keyframe_times if 0 < t * fps < n_frames})
+
+    boundaries = [0]
+    for i in range(1, n_segments):
+        ideal = i * n_frames // n_segments
+        if keyframes:
+            # Keyframe mais próximo do ponto ideal de corte
+            ideal = min(keyframes, key=lambda frame: abs(frame - ideal))
+        if ideal > boundaries[-1]:
+            boundaries.append(ideal)
+    boundaries.append(n_frames)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def reference_encodings(frame, face_ids, detector):
+    """Codificações faciais (128-d) dos rostos `face_ids` no frame, para reidentificá-los."""
+    face_locations = detector.detect(frame)
+    found = [face_id for face_id in face_ids if face_id < len(face_locations)]
+    if not found:
+        return {}
+    encodings = face_recognition.face_encodings(frame, [face_locations[face_id] for face_id in found])
+    return dict(zip(found, encodings))
+
+
+def _match_faces(frame, encodings, detector, tolerance=FACE_MATCH_TOLERANCE):
+    """Associa cada codificação de `encodings` ({id: codificação}) a um rosto do frame.
+
+    Os pares mais parecidos são associados primeiro, cada rosto do frame
+    no máximo uma vez, e só se a distância for no máximo `tolerance`;
+    rostos sem correspondência ficam fora do resultado.
+    """
+    face_locations = detector.detect(frame)
+    if not face_locations:
+        return {}
+    frame_encodings = face_recognition.face_encodings(frame, face_locations)
+    distances = {
+        face_id: face_recognition.face_distance(frame_encodings, encoding)
+        for face_id, encoding in encodings.items()
+    }
+    pairs = sorted((float(distance), face_id, local_id)
+                   for face_id, row in distances.items() for local_id, distance in enumerate(row))
+
+    matches = {}
+    for distance, face_id, local_id in pairs:
+        if distance > tolerance:
+            break
+        if face_id not in matches and local_id not in matches.values():
+            matches[face_id] = local_id
+    return matches
+
+
+def _init_worker(processor_settings):
+    global _worker_processor
+    from lipsync_processor import LipSyncProcessor
+    _worker_processor = LipSyncProcessor.from_settings(processor_settings)
+
+
+def _render_segment(video_path, assignments, encodings, start, end, segment_path):
+    """Processa os frames [start, end) do vídeo e grava o trecho sem áudio.
+
+    Retorna o caminho do trecho e o snapshot das métricas do worker para ele.
+    """
+    processor = _worker_processor
+    processor.reset_metrics()
+    video = VideoFileClip(video_path)
+    fps = video.fps if video.fps else 30
+
+    # Índices globais dos frames garantem o alinhamento exato com o áudio
+    frames = ((frame_idx, video.get_frame(frame_idx / fps)) for frame_idx in range(start, end))
+
+    cached_index = None
+    tracker = processor.create_tracker()
+    if processor.detection_cache is not None:
+        cached_index = processor.detection_cache.load(
+            processor.detection_cache.key(video_path, tracker.params())
+        )
+
+    if cached_index is not None:
+        # O índice do cache usa os IDs globais dos rostos
+        tracker = CachedFaceBoxes(cached_index)
+        tracker.frame_idx = start
+    elif encodings:
+        # Os IDs do tracker são locais ao trecho: reidentificar os rostos escolhidos
+        local_ids = _match_faces(video.get_frame(start / fps), encodings, processor.face_detector)
+        if local_ids:
+            # Rostos não reencontrados ficam sem alteração neste trecho, em vez de
+            # sincronizar o rosto errado
+            missing = [a['face_id'] for a in assignments if a['face_id'] not in local_ids]
+            if missing:
+                logger.warning(f"Rostos {missing} não reencontrados no trecho {start}-{end}")
+            assignments = [dict(assignment, face_id=local_ids[assignment['face_id']])
+                           for assignment in assignments if assignment['face_id'] in local_ids]
+        else:
+            # Nenhum rosto reconhecido no primeiro frame: manter os IDs do tracker do trecho
+            logger.warning(f"Nenhum rosto reconhecido no início do trecho {start}-{end}; "
+                           f"usando os IDs do rastreador")
+
+    tracks = processor.face_tracks(assignments)
+
+    writer = processor.create_writer(segment_path, video.size, fps)
+    try:
+        processor.render_frames(frames, tracks, fps, tracker, writer)
+    finally:
+        writer.close()
+        video.close()
+
+    return segment_path, processor.metrics_snapshot()
+
+
+def process_video_parallel(processor_settings, video_path, audio_path, face_id=0, workers=2,
+                           metrics=None):
+    """Processa um vídeo dividindo-o em trechos processados em paralelo.
+
+    O vídeo é cortado em keyframes, cada trecho é processado num processo
+    do pool (que carrega o `Wav2LipModel` uma única vez) e os trechos
+    codificados são concatenados sem recodificação. O áudio original é
+    adicionado uma única vez no final. `face_id` aceita a mesma seleção de
+    rostos de `LipSyncProcessor.process_media`.
+
+    Se `metrics` (um `PipelineMetrics`) for informado, recebe a soma das
+    métricas dos workers e o tempo total da execução.
+    """
+    started = time.perf_counter()
+    video = VideoFileClip(video_path)
+    fps = video.fps if video.fps else 30
+    n_frames = int(video.duration * fps)
+    assignments = face_assignments(face_id, audio_path)
+    # Mesmo detector dos workers, para que os IDs dos rostos coincidam
+    detector = FaceDetector(scale=processor_settings.get('detection_scale', 0.5),
+                            roi_padding=processor_settings.get('roi_padding', 0.5))
+    references = reference_encodings(
+        video.get_frame(0), list(dict.fromkeys(a['face_id'] for a in assignments)), detector
+    )
+    video.close()
+
+    segments = plan_segments(n_frames, fps, find_keyframes(video_path), workers)
+    logger.info(f"Processando {len(segments)} trechos com {workers} workers")
+
+    # Calcular os espectrogramas uma vez para aquecer o cache de áudio dos workers
+    if processor_settings.get('cache_dir'):
+        from audio_processor import AudioProcessor
+        from audio_cache import AudioFeatureCache
+        audio_processor = AudioProcessor(feature_cache=AudioFeatureCache(
+            os.path.join(processor_settings['cache_dir'], 'audio'),
+            max_bytes=processor_settings.get('audio_cache_max_bytes', 1024 * 1024 * 1024)
+        ))
+        for path in dict.fromkeys(assignment['audio_path'] for assignment in assignments):
+            audio_processor.extract_mel_features(path)
+
+    work_dir = tempfile.mkdtemp(prefix='lipsync_segments_')
+    try:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(processor_settings,)) as pool:
+            futures = [
+                pool.submit(_render_segment, video_path, assignments, references,
+                            start, end, os.path.join(work_dir, f'segment_{idx:05d}.mp4'))
+                for idx, (start, end) in enumerate(segments)
+            ]
+            segment_paths = []
+            for future in futures:
+                segment_path, snapshot = future.result()
+                segment_paths.append(segment_path)
+                if metrics is not None:
+                    metrics.merge(snapshot)
+
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w') as file:
+            for path in segment_paths:
+                file.write(f"file '{path}'\n")
+
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_output:
+            output_path = temp_output.name
+
+        # Concatenar sem recodificar o vídeo e adicionar o áudio original
+        extension = os.path.splitext(audio_path)[1].lower()
+        audio_codec = 'copy' if extension in COPYABLE_AUDIO_EXTENSIONS else 'aac'
+        subprocess.run(
+            [get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+             '-f', 'concat', '-safe', '0', '-i', list_path, '-i', audio_path,
+             '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy', '-c:a', audio_codec,
+             '-shortest', output_path],
+            check=True
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if metrics is not None:
+        metrics.add_time('total', time.perf_counter() - started)
+        metrics.count('jobs')
+    return output_path
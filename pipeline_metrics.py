@@ -0,0 +1,249 @@
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Contexto reutilizado por todos os estágios quando as métricas estão desligadas
+_DISABLED = nullcontext()
+
+
+def peak_rss_bytes():
+    """Pico de memória residente do processo, em bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # O Linux informa em KiB; o macOS, em bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+
+class PipelineMetrics:
+    """Tempos por estágio e contadores do pipeline de lipsync.
+
+    Cada estágio acumula número de chamadas, tempo total e as últimas
+    `max_samples` durações (para p50/p95); `observe()` guarda amostras de
+    valores instantâneos, como a profundidade das filas entre estágios.
+    Desligado (`enabled=False`), `stage()` devolve um contexto vazio
+    compartilhado e `count()`/`observe()` retornam imediatamente, então a
+    instrumentação custa uma chamada de função. Os estágios podem rodar em
+    threads diferentes.
+    """
+
+    def __init__(self, enabled=True, max_samples=1024):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def _new_series(self):
+        return {'count': 0, 'total': 0.0, 'max': 0.0, 'samples': deque(maxlen=self.max_samples)}
+
+    def stage(self, name):
+        """Contexto que mede o tempo de um estágio: `with metrics.stage('blend'): ...`"""
+        if not self.enabled:
+            return _DISABLED
+        return _StageTimer(self, name)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = self._new_series()
+            stage['count'] += 1
+            stage['total'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+            stage['samples'].append(seconds)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Registra uma amostra de um valor instantâneo (ex.: itens numa fila)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = self.gauges[name] = self._new_series()
+            gauge['count'] += 1
+            gauge['total'] += value
+            gauge['max'] = max(gauge['max'], value)
+            gauge['samples'].append(value)
+
+    def snapshot(self):
+        """Estado serializável em JSON, que pode ser combinado com `merge`."""
+        with self._lock:
+            return {
+                'stages': _series_snapshot(self.stages),
+                'gauges': _series_snapshot(self.gauges),
+                'counters': dict(self.counters),
+                'peak_rss_bytes': peak_rss_bytes(),
+            }
+
+    def merge(self, snapshot):
+        """Soma ao estado atual o snapshot de outro processo."""
+        with self._lock:
+            for series, others in ((self.stages, snapshot['stages']),
+                                   (self.gauges, snapshot.get('gauges', {}))):
+                for name, other in others.items():
+                    current = series.get(name)
+                    if current is None:
+                        current = series[name] = self._new_series()
+                    current['count'] += other['count']
+                    current['total'] += other['total']
+                    current['max'] = max(current['max'], other.get('max', 0.0))
+                    current['samples'].extend(other['samples'])
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+        return self
+
+
+def _series_snapshot(series):
+    return {
+        name: {'count': item['count'], 'total': item['total'], 'max': item['max'],
+               'samples': list(item['samples'])}
+        for name, item in series.items()
+    }
+
+
+def summarize(snapshot):
+    """Relatório legível de um snapshot: ms por estágio, contadores, fps e memória."""
+    stages = {}
+    for name, stage in snapshot['stages'].items():
+        samples = sorted(stage['samples'])
+        stages[name] = {
+            'calls': stage['count'],
+            'total_ms': round(stage['total'] * 1000, 3),
+            'mean_ms': round(stage['total'] * 1000 / max(1, stage['count']), 3),
+            'p50_ms': round(_percentile(samples, 0.50) * 1000, 3),
+            'p95_ms': round(_percentile(samples, 0.95) * 1000, 3),
+        }
+
+    gauges = {}
+    for name, gauge in snapshot.get('gauges', {}).items():
+        samples = sorted(gauge['samples'])
+        gauges[name] = {
+            'mean': round(gauge['total'] / max(1, gauge['count']), 3),
+            'p95': _percentile(samples, 0.95),
+            'max': gauge['max'],
+        }
+
+    counters = snapshot['counters']
+    total = snapshot['stages'].get('total', {}).get('total', 0.0)
+    return {
+        'stages': stages,
+        'gauges': gauges,
+        'counters': counters,
+        'frames_per_second': round(counters.get('frames', 0) / total, 3) if total else None,
+        'peak_rss_mb': round(snapshot['peak_rss_bytes'] / (1024 * 1024), 1),
+    }
+
+
+def write_snapshot(snapshot, path):
+    """Grava o snapshot de forma atômica (leitores nunca veem um arquivo parcial)."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temp_path, path)
+
+
+def read_snapshots(directory):
+    """Lê os snapshots `*.json` de um diretório, ignorando arquivos inválidos."""
+    snapshots = []
+    if not directory or not os.path.isdir(directory):
+        return snapshots
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def prometheus_text(snapshots, prefix='lipsync', gauges=None):
+    """Formata snapshots (somados) no formato de exposição de texto do Prometheus.
+
+    `gauges` é uma lista opcional de (nome, rótulos, valor) com métricas
+    adicionais do processo web, como jobs por status.
+    """
+    combined = PipelineMetrics()
+    peak = 0
+    for snapshot in snapshots:
+        combined.merge(snapshot)
+        peak = max(peak, snapshot.get('peak_rss_bytes', 0))
+
+    lines = [
+        f'# HELP {prefix}_stage_seconds Tempo gasto em cada estágio do pipeline.',
+        f'# TYPE {prefix}_stage_seconds summary',
+    ]
+    for name, stage in sorted(combined.stages.items()):
+        samples = sorted(stage['samples'])
+        for quantile in (0.5, 0.95):
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{quantile}"}} '
+                         f'{_percentile(samples, quantile):.6f}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stage["total"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+
+    if combined.gauges:
+        lines.append(f'# HELP {prefix}_gauge Amostras de valores instantâneos (ex.: profundidade das filas).')
+        lines.append(f'# TYPE {prefix}_gauge summary')
+    for name, gauge in sorted(combined.gauges.items()):
+        samples = sorted(gauge['samples'])
+        for quantile in (0.5, 0.95):
+            lines.append(f'{prefix}_gauge{{name="{name}",quantile="{quantile}"}} '
+                         f'{_percentile(samples, quantile)}')
+        lines.append(f'{prefix}_gauge_sum{{name="{name}"}} {gauge["total"]}')
+        lines.append(f'{prefix}_gauge_count{{name="{name}"}} {gauge["count"]}')
+
+    for name, value in sorted(combined.counters.items()):
+        lines.append(f'# TYPE {prefix}_{name}_total counter')
+        lines.append(f'{prefix}_{name}_total {value}')
+
+    lines.append(f'# HELP {prefix}_peak_rss_bytes Maior pico de memória residente entre os processos.')
+    lines.append(f'# TYPE {prefix}_peak_rss_bytes gauge')
+    lines.append(f'{prefix}_peak_rss_bytes {peak}')
+
+    declared = set()
+    for name, labels, value in gauges or []:
+        if name not in declared:
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            declared.add(name)
+        label_text = ','.join(f'{key}="{label}"' for key, label in sorted(labels.items()))
+        lines.append(f'{prefix}_{name}{{{label_text}}} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 import argparse
+import json
 import os
 import sys
+import time
 from pathlib import Path
 from typing import Optional
 import logging
-from lipsync_processor import LipSyncProcessor
+import model_server
 
 # Configurar logging
 logging.basicConfig(
@@ -15,24 +17,113 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class ProcessorCommands:
-    def __init__(self):
+    def __init__(self, batch_size: int = 64, chunk_size: int = 256, detect_interval: int = 10,
+                 detection_scale: float = 0.5, roi_padding: float = 0.5,
+                 cache_dir: Optional[str] = 'cache', workers: int = 1,
+                 socket_path: Optional[str] = model_server.DEFAULT_SOCKET_PATH,
+                 jit_compile: bool = False, backend: str = 'keras',
+                 calibration_media: Optional[list] = None, encode_options: Optional[dict] = None,
+                 silence_threshold: Optional[float] = -1.5, duplicate_threshold: Optional[int] = 4,
+                 profile: bool = False, profile_output: Optional[str] = None, pipelined: bool = True):
         self.processor = None
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.detect_interval = detect_interval
+        self.detection_scale = detection_scale
+        self.roi_padding = roi_padding
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.socket_path = socket_path
+        self.jit_compile = jit_compile
+        self.backend = backend
+        self.calibration_media = calibration_media
+        self.encode_options = encode_options
+        self.silence_threshold = silence_threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.profile = profile or profile_output is not None
+        self.profile_output = profile_output
+        self.pipelined = pipelined
         self.weights_path = os.path.join('weights', 'wav2lip_gan.pth')
         
-    def initialize_processor(self):
-        """Inicializa o processador com os pesos do modelo."""
+    def processor_settings(self) -> dict:
+        """Configuração serializável do processador (também usada pelos workers)."""
+        return {
+            'model_path': self.weights_path,
+            'batch_size': self.batch_size,
+            'chunk_size': self.chunk_size,
+            'detect_interval': self.detect_interval,
+            'detection_scale': self.detection_scale,
+            'roi_padding': self.roi_padding,
+            'cache_dir': self.cache_dir,
+            'jit_compile': self.jit_compile,
+            'backend': self.backend,
+            'calibration_media': self.calibration_media,
+            'backend_dir': os.path.join(self.cache_dir, 'backends') if self.cache_dir else None,
+            'encode_options': self.encode_options,
+            'silence_threshold': self.silence_threshold,
+            'duplicate_threshold': self.duplicate_threshold,
+            'profile': self.profile,
+            'pipelined': self.pipelined,
+        }
+
+    def check_weights(self):
+        """Encerra com erro se os pesos do modelo não estiverem disponíveis."""
         if not os.path.exists(self.weights_path):
             logger.error(f"Pesos do modelo não encontrados em {self.weights_path}")
             logger.info("Execute 'python download_weights.py' primeiro para baixar os pesos")
             sys.exit(1)
+
+    def initialize_processor(self):
+        """Inicializa o processador com os pesos do modelo."""
+        self.check_weights()
             
         try:
-            self.processor = LipSyncProcessor(model_path=self.weights_path)
-            logger.info("Processador inicializado com sucesso")
+            # Importado sob demanda: o caminho do daemon não carrega o TensorFlow
+            started = time.perf_counter()
+            from lipsync_processor import LipSyncProcessor
+            imported = time.perf_counter()
+            self.processor = LipSyncProcessor.from_settings(self.processor_settings())
+            logger.info(f"Processador inicializado com sucesso (importação: {imported - started:.2f}s, "
+                        f"modelo: {time.perf_counter() - imported:.2f}s)")
         except Exception as e:
             logger.error(f"Erro ao inicializar o processador: {str(e)}")
             sys.exit(1)
     
+    def process_remote(self, media_path: str, audio_path: str, face_id, output_path: str) -> str:
+        """Envia o job ao servidor de modelo já carregado.
+
+        As opções do encoder seguem com o job; as demais configurações são
+        conferidas pelo servidor, que recusa o job se diferirem das suas.
+        """
+        if isinstance(face_id, list):
+            # O servidor pode rodar em outro diretório de trabalho
+            face_id = [dict(face, audio_path=os.path.abspath(face['audio_path']))
+                       if face.get('audio_path') else face for face in face_id]
+        response = model_server.send_request({
+            'media_path': os.path.abspath(media_path),
+            'audio_path': os.path.abspath(audio_path),
+            'face_id': face_id,
+            'output_path': os.path.abspath(output_path),
+            'encode_options': self.encode_options,
+            'settings': model_server.comparable_settings(self.processor_settings()),
+        }, self.socket_path)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', 'Erro desconhecido no servidor de modelo'))
+        return output_path
+
+    def serve(self):
+        """Inicia o servidor de modelo, mantendo o processador carregado."""
+        self.check_weights()
+        try:
+            server = model_server.ModelServer(self.processor_settings(), self.socket_path)
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            logger.info("Servidor de modelo encerrado")
+
     def validate_files(self, media_path: str, audio_path: str) -> bool:
         """Valida os arquivos de entrada."""
         if not os.path.exists(media_path):
@@ -61,12 +152,29 @@ class ProcessorCommands:
             
         return True
     
-    def process(self, media_path: str, audio_path: str, face_id: int = 0, output_path: Optional[str] = None) -> str:
-        """Processa a mídia com sincronização labial."""
+    def process(self, media_path: str, audio_path: str, face_id=0, output_path: Optional[str] = None) -> str:
+        """Processa a mídia com sincronização labial.
+
+        `face_id` é o ID de um rosto ou uma lista de rostos com seus áudios e
+        intervalos (veja `face_selection.face_assignments`).
+        """
         if not self.validate_files(media_path, audio_path):
             sys.exit(1)
+        if isinstance(face_id, list):
+            for face in face_id:
+                if face.get('audio_path') and not self.validate_files(media_path, face['audio_path']):
+                    sys.exit(1)
             
-        if self.processor is None:
+        # Vídeos com vários workers são divididos em trechos; cada worker carrega seu modelo
+        parallel = self.workers > 1 and media_path.lower().endswith('.mp4')
+        # O perfil mede o processo que roda o pipeline, então não usa o daemon
+        use_daemon = (not parallel and not self.profile and self.processor is None
+                      and self.socket_path and model_server.is_running(self.socket_path))
+        if parallel:
+            self.check_weights()
+        elif use_daemon:
+            logger.info(f"Usando o servidor de modelo em {self.socket_path}")
+        elif self.processor is None:
             self.initialize_processor()
             
         try:
@@ -87,7 +195,17 @@ class ProcessorCommands:
             logger.info(f"ID do rosto: {face_id}")
             
             # Processar mídia
-            result_path = self.processor.process_media(media_path, audio_path, face_id)
+            if parallel:
+                from parallel_video import process_video_parallel
+                from pipeline_metrics import PipelineMetrics
+                metrics = PipelineMetrics() if self.profile else None
+                result_path = process_video_parallel(self.processor_settings(), media_path,
+                                                     audio_path, face_id, workers=self.workers,
+                                                     metrics=metrics)
+            elif use_daemon:
+                result_path = self.process_remote(media_path, audio_path, face_id, output_path)
+            else:
+                result_path = self.processor.process_media(media_path, audio_path, face_id)
             
             # Mover para o caminho de saída desejado
             if result_path != output_path:
@@ -96,13 +214,171 @@ class ProcessorCommands:
             logger.info(f"Processamento concluído com sucesso!")
             logger.info(f"Arquivo de saída: {output_path}")
             
+            if self.profile:
+                snapshot = metrics.snapshot() if parallel else self.processor.metrics_snapshot()
+                self.report_profile(snapshot)
+            
             return output_path
             
         except Exception as e:
             logger.error(f"Erro durante o processamento: {str(e)}")
             sys.exit(1)
 
+    def report_profile(self, snapshot: dict):
+        """Mostra o relatório de perfil e o grava em `profile_output`, se informado."""
+        from pipeline_metrics import summarize
+        report = json.dumps(summarize(snapshot), indent=2)
+        print(report)
+        if self.profile_output:
+            with open(self.profile_output, 'w') as file:
+                file.write(report + '\n')
+            logger.info(f"Relatório de perfil salvo em: {self.profile_output}")
+
+    def run_batch(self, manifest_path: str, results_path: str) -> int:
+        """Processa um manifesto de jobs num pool de `workers` processos."""
+        if not os.path.exists(manifest_path):
+            logger.error(f"Manifesto não encontrado: {manifest_path}")
+            sys.exit(1)
+        self.check_weights()
+
+        from batch_runner import run_batch
+        try:
+            processed = run_batch(self.processor_settings(), manifest_path, results_path,
+                                  workers=self.workers)
+        except Exception as e:
+            logger.error(f"Erro durante o processamento em lote: {str(e)}")
+            sys.exit(1)
+
+        logger.info(f"Lote concluído: {processed} jobs processados")
+        logger.info(f"Resultados em: {results_path}")
+        return processed
+
+def add_processing_arguments(parser):
+    """Opções do processador compartilhadas pelo modo simples e pelo `batch`."""
+    parser.add_argument('-b', '--batch-size', type=int, default=64,
+                      help='Frames por lote de inferência do modelo (padrão: 64)')
+    parser.add_argument('--chunk-size', type=int, default=256,
+                      help='Frames de vídeo mantidos em memória por vez (padrão: 256)')
+    parser.add_argument('--detect-interval', type=int, default=10,
+                      help='Frames entre detecções completas de rostos em vídeos (padrão: 10)')
+    parser.add_argument('--detect-scale', type=float, default=0.5,
+                      help='Escala do frame usado na detecção de rostos, 1 para a resolução original (padrão: 0.5)')
+    parser.add_argument('--roi-padding', type=float, default=0.5,
+                      help='Margem, em tamanhos de rosto, da busca em volta dos rostos conhecidos (padrão: 0.5)')
+    parser.add_argument('--cache-dir', type=str, default='cache',
+                      help='Diretório dos caches persistentes (padrão: cache)')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Desabilitar os caches persistentes')
+    parser.add_argument('--xla', action='store_true',
+                      help='Compilar os grafos de inferência com XLA')
+    parser.add_argument('--backend', choices=['keras', 'tflite-fp16', 'tflite-int8'], default='keras',
+                      help='Backend de inferência; os TFLite são quantizados para CPU (padrão: keras)')
+    parser.add_argument('--calibrate', nargs=2, action='append', metavar=('MEDIA', 'AUDIO'),
+                      help='Par de mídia/áudio de exemplo para calibrar a quantização int8 (repetível)')
+    parser.add_argument('--preset', type=str, default='medium',
+                      help='Preset do x264: mais rápido gera arquivos maiores (padrão: medium)')
+    parser.add_argument('--crf', type=int, default=23,
+                      help='Qualidade do x264, menor é melhor (padrão: 23)')
+    parser.add_argument('--encode-threads', type=int, default=0,
+                      help='Threads do encoder, 0 para automático (padrão: 0)')
+    parser.add_argument('--silence-threshold', type=float, default=-1.5,
+                      help='Energia mel média abaixo da qual a janela é tratada como silêncio (padrão: -1.5)')
+    parser.add_argument('--no-silence-skip', action='store_true',
+                      help='Rodar o modelo também nas janelas de silêncio')
+    parser.add_argument('--duplicate-threshold', type=int, default=4,
+                      help='Bits de diferença (dHash) até os quais um rosto reaproveita a última inferência (padrão: 4)')
+    parser.add_argument('--no-frame-reuse', action='store_true',
+                      help='Inferir todos os frames de vídeo, sem reaproveitar resultados')
+    parser.add_argument('--no-pipeline', action='store_true',
+                      help='Decodificar, inferir e codificar em sequência, sem threads paralelas')
+    parser.add_argument('--profile', action='store_true',
+                      help='Medir o tempo de cada estágio e mostrar um relatório JSON ao final')
+    parser.add_argument('--profile-output', type=str,
+                      help='Arquivo onde gravar o relatório JSON de perfil (implica --profile)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                      help='Mostrar mensagens detalhadas')
+
+
+def commands_from_args(args, workers=1, socket_path=None) -> ProcessorCommands:
+    """Cria o ProcessorCommands a partir das opções de `add_processing_arguments`."""
+    # Ajustar nível de logging
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    return ProcessorCommands(
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        detect_interval=args.detect_interval,
+        detection_scale=args.detect_scale,
+        roi_padding=args.roi_padding,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        workers=workers,
+        socket_path=socket_path,
+        jit_compile=args.xla,
+        backend=args.backend,
+        calibration_media=args.calibrate,
+        encode_options={'preset': args.preset, 'crf': args.crf, 'threads': args.encode_threads},
+        silence_threshold=None if args.no_silence_skip else args.silence_threshold,
+        duplicate_threshold=None if args.no_frame_reuse else args.duplicate_threshold,
+        profile=args.profile,
+        profile_output=args.profile_output,
+        pipelined=not args.no_pipeline
+    )
+
+
+def face_selection_from_args(args):
+    """Monta a seleção de rostos a partir de --face-audio/--face-range (ou só --face-id)."""
+    if not args.face_audio and not args.face_range:
+        return args.face_id
+
+    faces = {}
+    try:
+        for face, audio in args.face_audio or []:
+            faces.setdefault(int(face), {'face_id': int(face)})['audio_path'] = audio
+        for face, start, end in args.face_range or []:
+            faces.setdefault(int(face), {'face_id': int(face)}).setdefault('ranges', []).append(
+                [float(start), float(end)]
+            )
+    except ValueError:
+        raise SystemExit("Erro: IDs de rosto devem ser inteiros e intervalos em segundos")
+    return list(faces.values())
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='processor_commands.py batch',
+        description='Processa em lote os jobs de um manifesto CSV ou JSONL',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+O manifesto tem os campos media, audio, face_id (opcional), output e
+job_id (opcional; padrão: o caminho de saída). O campo opcional faces
+(lista JSON, como em --face-audio/--face-range) sincroniza vários rostos
+no mesmo job. Exemplo em CSV:
+
+  media,audio,face_id,output
+  apresentador.mp4,fala_pt.wav,0,saida/fala_pt.mp4
+  apresentador.mp4,fala_es.wav,0,saida/fala_es.mp4
+
+Jobs já concluídos no arquivo de resultados são pulados ao reexecutar.
+        """
+    )
+    parser.add_argument('manifest', help='Manifesto de jobs (.csv ou .jsonl)')
+    parser.add_argument('-r', '--results', type=str, default='results.jsonl',
+                      help='Arquivo JSONL com o resultado e o tempo de cada job (padrão: results.jsonl)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                      help='Processos paralelos, cada um com seu modelo (padrão: 1)')
+    add_processing_arguments(parser)
+
+    args = parser.parse_args(argv)
+    processor = commands_from_args(args, workers=args.workers)
+    processor.run_batch(args.manifest, args.results)
+
+
 def main():
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description='Sincronização labial usando Wav2Lip',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -111,30 +387,52 @@ Exemplos:
   %(prog)s video.mp4 audio.wav
   %(prog)s -f 1 imagem.png audio.wav -o resultado.mp4
   %(prog)s --face-id 0 video.mp4 audio.wav --output video_sync.mp4
+  %(prog)s dialogo.mp4 mix.wav --face-audio 0 ana.wav --face-audio 1 bruno.wav
+  %(prog)s dialogo.mp4 mix.wav --face-range 0 0 12.5 --face-range 1 12.5 30
+  %(prog)s --serve    # mantém o modelo carregado para as próximas execuções
+  %(prog)s batch jobs.csv --results resultados.jsonl -w 4
         """
     )
     
-    parser.add_argument('media', help='Caminho para o arquivo de mídia (vídeo ou imagem)')
-    parser.add_argument('audio', help='Caminho para o arquivo de áudio')
+    parser.add_argument('media', nargs='?', help='Caminho para o arquivo de mídia (vídeo ou imagem)')
+    parser.add_argument('audio', nargs='?', help='Caminho para o arquivo de áudio')
     parser.add_argument('-f', '--face-id', type=int, default=0,
                       help='ID do rosto a ser processado (padrão: 0)')
+    parser.add_argument('--face-audio', nargs=2, action='append', metavar=('FACE_ID', 'AUDIO'),
+                      help='Sincronizar o rosto com a sua própria faixa de áudio (repetível; '
+                           'o áudio principal continua sendo o do resultado)')
+    parser.add_argument('--face-range', nargs=3, action='append', metavar=('FACE_ID', 'INICIO', 'FIM'),
+                      help='Sincronizar o rosto só entre INICIO e FIM segundos (repetível)')
     parser.add_argument('-o', '--output', type=str,
                       help='Caminho para o arquivo de saída (opcional)')
-    parser.add_argument('-v', '--verbose', action='store_true',
-                      help='Mostrar mensagens detalhadas')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                      help='Processos paralelos para vídeos, cada um com seu modelo (padrão: 1)')
+    parser.add_argument('--serve', action='store_true',
+                      help='Iniciar o servidor de modelo (daemon) no socket Unix')
+    parser.add_argument('--socket', type=str, default=model_server.DEFAULT_SOCKET_PATH,
+                      help=f'Socket do servidor de modelo (padrão: {model_server.DEFAULT_SOCKET_PATH})')
+    parser.add_argument('--no-daemon', action='store_true',
+                      help='Processar sempre no próprio processo, sem usar o servidor de modelo')
+    add_processing_arguments(parser)
     
     args = parser.parse_args()
-    
-    # Ajustar nível de logging
-    if args.verbose:
-        logger.setLevel(logging.DEBUG)
+    if not args.serve and (args.media is None or args.audio is None):
+        parser.error('os argumentos media e audio são obrigatórios')
     
     # Processar mídia
-    processor = ProcessorCommands()
+    processor = commands_from_args(
+        args,
+        workers=args.workers,
+        socket_path=None if args.no_daemon else args.socket
+    )
+    if args.serve:
+        processor.serve()
+        return
+    
     processor.process(
         media_path=args.media,
         audio_path=args.audio,
-        face_id=args.face_id,
+        face_id=face_selection_from_args(args),
         output_path=args.output
     )
 
@@ -0,0 +1,31 @@
+import os
+
+from content_hash import content_key, file_digest
+from face_selection import face_assignments
+
+# Configurações do processador que afetam só desempenho ou infraestrutura,
+# não o vídeo gerado; as demais entram na chave do resultado
+OPERATIONAL_SETTINGS = frozenset({
+    'batch_size', 'chunk_size', 'cache_dir', 'detection_cache_max_bytes',
+    'audio_cache_max_bytes', 'backend_dir', 'jit_compile', 'compiled', 'profile', 'pipelined',
+})
+
+
+def result_key(media_path, audio_path, face_id, processor_settings):
+    """Chave do resultado de um job, endereçada pelo conteúdo das entradas.
+
+    Combina o hash da mídia, do áudio e do áudio de cada rosto
+    selecionado (os caminhos não importam, só os bytes) com a seleção de
+    rostos e as configurações do processador que mudam a saída.
+    """
+    faces = [
+        dict(assignment, audio_path=file_digest(assignment['audio_path']))
+        for assignment in face_assignments(face_id, audio_path)
+    ]
+    settings = {name: value for name, value in processor_settings.items()
+                if name not in OPERATIONAL_SETTINGS}
+    if os.path.exists(settings.get('model_path') or ''):
+        # Pesos trocados no mesmo caminho geram outros resultados
+        settings['model_path'] = file_digest(settings['model_path'])
+    return content_key(media_path, {'audio': file_digest(audio_path), 'faces': faces,
+                                    'settings': settings})
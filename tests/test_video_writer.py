@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('moviepy')
+
+import video_writer
+from video_writer import FFmpegWriter
+
+
+class FakePopen:
+    def __init__(self, command, **kwargs):
+        self.command = command
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    monkeypatch.setattr(video_writer, 'get_setting', lambda name: 'ffmpeg')
+    monkeypatch.setattr(video_writer.subprocess, 'Popen', FakePopen)
+
+    def build(size, **kwargs):
+        return FFmpegWriter('saida.mp4', size, 25, **kwargs).process.command
+    return build
+
+
+def test_odd_size_is_padded_to_even(commands):
+    command = commands((641, 359))
+
+    assert command[command.index('-s') + 1] == '641x359'
+    assert command[command.index('-vf') + 1] == 'pad=ceil(iw/2)*2:ceil(ih/2)*2'
+    # O filtro precisa vir antes da conversão para yuv420p na saída
+    assert command.index('-vf') < len(command) - 1 - command[::-1].index('-pix_fmt')
+    assert command[-1] == 'saida.mp4'
+
+
+def test_even_size_has_no_filter(commands):
+    command = commands((640, 360), audio_path='voz.wav')
+
+    assert '-vf' not in command
+    assert command[command.index('-c:a') + 1] == 'aac'
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from content_hash import file_digest
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ('fp16', 'int8')
+
+
+def calibration_digest(media_pairs, max_samples=256):
+    """Hash do conteúdo dos clipes de calibração, para compor o nome dos modelos exportados."""
+    contents = [[file_digest(media_path), file_digest(audio_path)]
+                for media_path, audio_path in media_pairs]
+    return hashlib.sha256(json.dumps([contents, max_samples]).encode()).hexdigest()
+
+
+def collect_calibration_samples(processor, media_pairs, max_samples=256):
+    """Extrai pares (face 96x96 uint8, janela mel) de clipes de exemplo.
+
+    `media_pairs` é uma lista de (mídia, áudio). De cada vídeo são usados os
+    primeiros frames com rosto; de cada imagem, o rosto 0 com as janelas
+    de áudio dos primeiros frames.
+    """
+    # Importado aqui para evitar dependência circular com lipsync_processor
+    from moviepy.editor import VideoFileClip
+
+    faces, mels = [], []
+    per_pair = max(1, max_samples // max(1, len(media_pairs)))
+    for media_path, audio_path in media_pairs:
+        mel_features = processor.audio_processor.extract_mel_features(audio_path)
+
+        if media_path.lower().endswith('.mp4'):
+            video = VideoFileClip(media_path)
+            fps = video.fps if video.fps else 30
+            tracker = processor.create_tracker()
+            samples = []
+            for frame_idx, frame in enumerate(video.iter_frames()):
+                box = tracker.locate(frame, 0)
+                if box is not None:
+                    samples.append((frame_idx, processor._get_face_region(frame, box)))
+                if len(samples) >= per_pair:
+                    break
+            video.close()
+        else:
+            image = cv2.cvtColor(cv2.imread(media_path), cv2.COLOR_BGR2RGB)
+            boxes = processor.detect_image_faces(media_path, image)
+            if not boxes:
+                continue
+            fps = 30
+            region = processor._get_face_region(image, boxes[0])
+            samples = [(frame_idx, region) for frame_idx in range(per_pair)]
+
+        for frame_idx, region in samples:
+            faces.append(cv2.resize(region, (96, 96), interpolation=cv2.INTER_AREA))
+            mels.append(processor.audio_processor.mel_windows(
+                mel_features, 1, fps, processor.mel_window_frames, start_frame=frame_idx
+            )[0])
+
+    if not faces:
+        return None
+    return np.stack(faces)[:max_samples], np.stack(mels)[:max_samples]
+
+
+class TFLiteBackend:
+    """Backend de inferência em CPU com modelos TFLite quantizados.
+
+    Exporta o grafo já construído do `Wav2LipModel` em três partes — modelo
+    completo, `face_encoder` e `audio_encoder` + `generator` — para
+    TFLite, com quantização pós-treino fp16 ou int8. A quantização int8
+    usa as amostras de calibração para calibrar as ativações; sem elas,
+    apenas os pesos são quantizados (faixa dinâmica). `calibration` pode
+    ser uma função que coleta as amostras: ela só é chamada se algum grafo
+    int8 precisar ser exportado, não quando todos vêm de `export_dir`.
+    Os arquivos exportados são gravados num temporário e renomeados, de
+    modo que outro processo nunca lê um modelo incompleto.
+
+    Implementa a mesma interface do `InferenceEngine` (`predict`,
+    `encode_face`, `predict_from_encoded`), então pode ser instalado com
+    `Wav2LipModel.use_backend`.
+    """
+
+    def __init__(self, model, batch_size=64, mel_window=16, mel_channels=80, quantization='int8',
+                 calibration=None, export_dir=None, model_tag='random', num_threads=None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantização não suportada: {quantization}")
+
+        self.model = model
+        self.batch_size = batch_size
+        self.mel_window = mel_window
+        self.quantization = quantization
+        self.calibration = calibration
+        self.num_threads = num_threads or os.cpu_count()
+
+        faces_spec = tf.TensorSpec((batch_size, 96, 96, 3), tf.float32)
+        mels_spec = tf.TensorSpec((batch_size, mel_channels, mel_window, 1), tf.float32)
+        features_spec = tf.TensorSpec((batch_size,) + tuple(model.face_encoder.output_shape[1:]),
+                                      tf.float32)
+
+        graphs = {
+            'wav2lip': (self._predict_graph, [faces_spec, mels_spec]),
+            'face_encoder': (self._encode_graph, [faces_spec]),
+            'decoder': (self._decode_graph, [features_spec, mels_spec]),
+        }
+
+        self.interpreters = {}
+        for name, (function, signature) in graphs.items():
+            path = None
+            if export_dir:
+                os.makedirs(export_dir, exist_ok=True)
+                path = os.path.join(
+                    export_dir,
+                    f'{name}_{model_tag}_{quantization}_b{batch_size}_w{mel_window}.tflite'
+                )
+
+            if path and os.path.exists(path):
+                with open(path, 'rb') as file:
+                    content = file.read()
+            else:
+                content = self._convert(name, function, signature)
+                if path:
+                    self._write_export(path, content)
+
+            interpreter = tf.lite.Interpreter(model_content=content, num_threads=self.num_threads)
+            interpreter.allocate_tensors()
+            self.interpreters[name] = interpreter
+
+    def _write_export(self, path, content):
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def calibration_samples(self):
+        """Amostras de calibração, coletadas na primeira vez em que são pedidas."""
+        if callable(self.calibration):
+            self.calibration = self.calibration()
+        return self.calibration
+
+    def collected_calibration(self):
+        """Amostras de calibração já coletadas, sem coletá-las (None se não houver)."""
+        return None if callable(self.calibration) else self.calibration
+
+    # Grafos exportados: entradas de face em 0-255, saídas em 0-255
+    def _predict_graph(self, faces, mels):
+        synced = self.model.model([faces / 127.5 - 1.0, mels], training=False)
+        return tf.clip_by_value((synced + 1.0) * 127.5, 0, 255)
+
+    def _encode_graph(self, faces):
+        return self.model.face_encoder(faces / 127.5 - 1.0, training=False)
+
+    def _decode_graph(self, face_features, mels):
+        encoded_audio = self.model.audio_encoder(mels, training=False)
+        synced = self.model.generator([face_features, encoded_audio], training=False)
+        return tf.clip_by_value((synced + 1.0) * 127.5, 0, 255)
+
+    def _representative_dataset(self, name):
+        """Gera lotes de calibração no formato de entrada de cada grafo."""
+        faces, mels = self.calibration
+        for start in range(0, len(faces), self.batch_size):
+            batch_faces = self._pad(faces[start:start + self.batch_size].astype(np.float32))
+            batch_mels = self._pad(mels[start:start + self.batch_size].astype(np.float32))
+            if name == 'wav2lip':
+                yield [batch_faces, batch_mels]
+            elif name == 'face_encoder':
+                yield [batch_faces]
+            else:
+                features = self.model.face_encoder(batch_faces / 127.5 - 1.0, training=False)
+                yield [features.numpy(), batch_mels]
+
+    def _convert(self, name, function, signature):
+        concrete = tf.function(function, input_signature=signature).get_concrete_function()
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], self.model.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if self.quantization == 'fp16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif self.calibration_samples() is not None:
+            converter.representative_dataset = lambda: self._representative_dataset(name)
+        else:
+            logger.warning(f"Sem amostras de calibração: {name} usará quantização int8 apenas dos pesos")
+
+        logger.info(f"Exportando {name} para TFLite ({self.quantization})")
+        return converter.convert()
+
+    def _pad(self, array):
+        missing = self.batch_size - len(array)
+        if missing == 0:
+            return array
+        return np.concatenate([array, np.zeros((missing,) + array.shape[1:], dtype=array.dtype)])
+
+    def _run(self, name, inputs, count):
+        interpreter = self.interpreters[name]
+        for detail, value in zip(interpreter.get_input_details(), inputs):
+            interpreter.set_tensor(detail['index'], value)
+        interpreter.invoke()
+        return interpreter.get_tensor(interpreter.get_output_details()[0]['index'])[:count]
+
+    def predict(self, faces, mels):
+        faces = np.asarray(faces, dtype=np.float32)
+        mels = np.asarray(mels, dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(faces), self.batch_size):
+            count = len(faces[start:start + self.batch_size])
+            synced = self._run('wav2lip', [self._pad(faces[start:start + self.batch_size]),
+                                           self._pad(mels[start:start + self.batch_size])], count)
+            outputs.append(np.round(synced).astype(np.uint8))
+
+        if not outputs:
+            return np.zeros((0, 96, 96, 3), dtype=np.uint8)
+        return np.concatenate(outputs, axis=0)
+
+    def encode_face(self, faces):
+        faces = np.asarray(faces, dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(faces), self.batch_size):
+            count = len(faces[start:start + self.batch_size])
+            outputs.append(self._run('face_encoder', [self._pad(faces[start:start + self.batch_size])],
+                                     count))
+        return np.concatenate(outputs, axis=0)
+
+    def predict_from_encoded(self, face_features, mels):
+        face_features = np.asarray(face_features, dtype=np.float32)
+        mels = np.asarray(mels, dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(mels), self.batch_size):
+            batch_mels = mels[start:start + self.batch_size]
+            count = len(batch_mels)
+            if len(face_features) == 1:
+                features = np.broadcast_to(face_features, (count,) + face_features.shape[1:])
+            else:
+                features = face_features[start:start + self.batch_size]
+
+            synced = self._run('decoder', [self._pad(np.ascontiguousarray(features)),
+                                           self._pad(batch_mels)], count)
+            outputs.append(np.round(synced).astype(np.uint8))
+
+        if not outputs:
+            return np.zeros((0, 96, 96, 3), dtype=np.uint8)
+        return np.concatenate(outputs, axis=0)
+
+
+def parity_check(model, backend, faces, mels):
+    """Compara a saída do backend com a do modelo Keras em fp32.
+
+    Retorna o erro absoluto máximo e médio (em níveis de 0-255) e o PSNR.
+    """
+    faces = np.asarray(faces, dtype=np.float32)
+    reference = model.model([faces / 127.5 - 1.0, np.asarray(mels, dtype=np.float32)],
+                            training=False).numpy()
+    reference = np.clip((reference + 1.0) * 127.5, 0, 255)
+    candidate = backend.predict(faces, mels).astype(np.float32)
+
+    error = np.abs(reference - candidate)
+    mse = float(np.mean(error ** 2))
+    return {
+        'max_abs_error': float(error.max()),
+        'mean_abs_error': float(error.mean()),
+        'psnr': float('inf') if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse)),
+    }
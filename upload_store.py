@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from content_hash import remember_digest
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Erro de upload com o status HTTP a devolver ao cliente."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadStore:
+    """Uploads em partes, retomáveis, gravados direto em disco.
+
+    Cada upload tem um arquivo `.part`, que cresce a cada parte recebida, e
+    um `.json` com os metadados (nome, tamanho total, bytes recebidos). As
+    partes são lidas do stream da requisição em blocos de `block_size`, de
+    modo que a memória não depende do tamanho do arquivo, e o SHA-256 é
+    atualizado à medida que os bytes chegam. Um upload interrompido
+    continua do último byte gravado (`offset`), inclusive após reiniciar o
+    servidor ou em outro processo: o hash em memória guarda quantos bytes
+    já consumiu e é refeito a partir do disco quando isso não bate com o
+    offset dos metadados.
+    """
+
+    def __init__(self, upload_dir='uploads', max_bytes=4 * 1024 * 1024 * 1024,
+                 block_size=1024 * 1024, max_age=24 * 3600):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.max_age = max_age
+        self._hashers = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.upload_dir, f'{upload_id}.json')
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.upload_dir, f'{upload_id}.part')
+
+    def _lock(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise UploadError('Upload não encontrado', 404)
+        try:
+            with open(self._meta_path(upload_id)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            raise UploadError('Upload não encontrado', 404)
+
+    def _save(self, meta):
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.upload_dir)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temp_path, self._meta_path(meta['id']))
+
+    def create(self, filename, size, sha256=None, kind=None):
+        """Abre um upload de `size` bytes; `sha256` (opcional) é conferido no final."""
+        if size < 0 or size > self.max_bytes:
+            raise UploadError(f'Arquivo maior que o limite de {self.max_bytes // (1024 * 1024)}MB', 413)
+        self.expire_stale()
+
+        meta = {
+            'id': uuid.uuid4().hex,
+            'filename': filename,
+            'kind': kind,
+            'size': size,
+            'offset': 0,
+            'expected_sha256': sha256.lower() if sha256 else None,
+            'sha256': None,
+            'path': None,
+            'created_at': time.time(),
+        }
+        open(self._part_path(meta['id']), 'wb').close()
+        self._save(meta)
+        self._hashers[meta['id']] = (hashlib.sha256(), 0)
+        if size == 0:
+            self._finalize(meta)
+        return meta
+
+    def status(self, upload_id):
+        return self._load(upload_id)
+
+    def _hasher(self, meta):
+        """SHA-256 dos bytes já recebidos, refeito a partir do disco se necessário.
+
+        O hash em memória só vale se consumiu exatamente `meta['offset']`
+        bytes; partes gravadas por outro processo (ou antes de reiniciar)
+        deixam de bater e o arquivo é lido de novo.
+        """
+        hasher, consumed = self._hashers.get(meta['id'], (None, None))
+        if hasher is None or consumed != meta['offset']:
+            hasher = hashlib.sha256()
+            with open(self._part_path(meta['id']), 'rb') as file:
+                remaining = meta['offset']
+                while remaining:
+                    block = file.read(min(self.block_size, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+        return hasher
+
+    def append(self, upload_id, offset, stream, length):
+        """Grava `length` bytes lidos de `stream` a partir de `offset`.
+
+        O offset precisa ser exatamente o número de bytes já recebidos
+        (senão `UploadError` 409 informa o offset correto para retomar).
+        """
+        with self._lock(upload_id):
+            meta = self._load(upload_id)
+            if meta['path'] is not None:
+                raise UploadError('Upload já concluído', 409, meta['offset'])
+            if offset != meta['offset']:
+                raise UploadError('Offset não corresponde aos bytes recebidos', 409, meta['offset'])
+            if length is None:
+                raise UploadError('Cabeçalho Content-Length obrigatório', 411, meta['offset'])
+            if meta['offset'] + length > meta['size']:
+                raise UploadError('A parte ultrapassa o tamanho declarado do arquivo', 400, meta['offset'])
+
+            hasher = self._hasher(meta)
+            received = 0
+            try:
+                with open(self._part_path(upload_id), 'r+b') as file:
+                    file.seek(meta['offset'])
+                    while received < length:
+                        block = stream.read(min(self.block_size, length - received))
+                        if not block:
+                            break
+                        file.write(block)
+                        hasher.update(block)
+                        received += len(block)
+                    file.truncate()
+            except Exception:
+                # Estado do hash incerto: será refeito a partir do disco
+                self._hashers.pop(upload_id, None)
+                raise
+
+            if received < length:
+                # Conexão interrompida: descartar a parte incompleta
+                self._hashers.pop(upload_id, None)
+                with open(self._part_path(upload_id), 'r+b') as file:
+                    file.truncate(meta['offset'])
+                raise UploadError('Parte incompleta', 400, meta['offset'])
+
+            meta['offset'] += received
+            self._hashers[upload_id] = (hasher, meta['offset'])
+            if meta['offset'] == meta['size']:
+                self._finalize(meta)
+            else:
+                self._save(meta)
+            return meta
+
+    def _finalize(self, meta):
+        digest = self._hasher(meta).hexdigest()
+        self._hashers.pop(meta['id'], None)
+        if meta['expected_sha256'] and digest != meta['expected_sha256']:
+            self.delete(meta['id'])
+            raise UploadError('O checksum do arquivo não confere; envie-o novamente', 422)
+
+        path = os.path.join(self.upload_dir, f"{meta['id']}_{meta['filename']}")
+        os.replace(self._part_path(meta['id']), path)
+        # O hash do upload serve de chave para os caches, sem reler o arquivo
+        remember_digest(path, digest)
+        meta.update(sha256=digest, path=path)
+        self._save(meta)
+
+    def delete(self, upload_id):
+        self._hashers.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def expire_stale(self):
+        """Remove uploads incompletos sem atividade há mais de `max_age` segundos."""
+        limit = time.time() - self.max_age
+        for filename in os.listdir(self.upload_dir):
+            if not filename.endswith('.part'):
+                continue
+            path = os.path.join(self.upload_dir, filename)
+            try:
+                if os.path.getmtime(path) < limit:
+                    self.delete(filename[:-len('.part')])
+            except FileNotFoundError:
+                continue
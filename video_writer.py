@@ -0,0 +1,83 @@
+import os
+import subprocess
+import numpy as np
+from moviepy.config import get_setting
+
+# Codecs de áudio que podem ser copiados para um MP4 sem recodificação
+COPYABLE_AUDIO_EXTENSIONS = ('.mp3', '.aac', '.m4a')
+
+DEFAULT_ENCODE_OPTIONS = {
+    'preset': 'medium',
+    'crf': 23,
+    'threads': 0,
+}
+
+
+class FFmpegWriter:
+    """Escreve frames RGB diretamente no stdin de um processo ffmpeg.
+
+    Cada frame é enviado como buffer bruto (sem cópias quando o array já é
+    contíguo) e codificado em H.264. Se `audio_path` for informado, o
+    áudio original é multiplexado no mesmo processo: copiado sem
+    decodificar quando o codec é compatível com MP4, ou convertido para AAC
+    caso contrário (ex.: WAV).
+    """
+
+    def __init__(self, output_path, size, fps, audio_path=None, preset='medium', crf=23, threads=0,
+                 codec='libx264'):
+        width, height = size
+        self.output_path = output_path
+        self.frame_shape = (height, width, 3)
+
+        command = [
+            get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-s', f'{width}x{height}', '-r', f'{fps:.05f}', '-i', '-',
+        ]
+        if audio_path:
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0']
+
+        if width % 2 or height % 2:
+            # yuv420p exige dimensões pares: completar com uma linha/coluna
+            command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+
+        command += ['-c:v', codec, '-preset', preset, '-crf', str(crf), '-threads', str(threads),
+                    '-pix_fmt', 'yuv420p']
+
+        if audio_path:
+            extension = os.path.splitext(audio_path)[1].lower()
+            audio_codec = 'copy' if extension in COPYABLE_AUDIO_EXTENSIONS else 'aac'
+            command += ['-c:a', audio_codec, '-shortest']
+
+        command.append(output_path)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write_frame(self, frame):
+        """Envia um frame (h, w, 3) uint8 ao ffmpeg."""
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame com shape {frame.shape}, esperado {self.frame_shape}")
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        try:
+            self.process.stdin.write(frame.data)
+        except BrokenPipeError:
+            self.close()
+            raise
+
+    def close(self):
+        """Finaliza a codificação; levanta RuntimeError se o ffmpeg falhar."""
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if not process.stdin.closed:
+            process.stdin.close()
+        error = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"Erro do ffmpeg ao gerar {self.output_path}: "
+                               f"{error.decode(errors='replace').strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
@@ -1,3 +1,4 @@
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers, Model
 
@@ -8,6 +9,9 @@ class Wav2LipModel:
         self.generator = self._build_generator()
         self.model = self._build_complete_model()
 
+        # Motor de inferência compilado (InferenceEngine), criado em compile_inference
+        self.engine = None
+
     def _build_face_encoder(self):
         """Constrói o encoder para características faciais."""
         inputs = layers.Input(shape=(96, 96, 3))
@@ -99,10 +103,27 @@ class Wav2LipModel:
         """Carrega os pesos do modelo."""
         self.model.load_weights(weights_path)
 
+    def compile_inference(self, batch_size=64, mel_window=16, jit_compile=False, warmup=True):
+        """Passa a executar as predições em lote num grafo `tf.function` compilado."""
+        from inference_engine import InferenceEngine
+        self.engine = InferenceEngine(self, batch_size=batch_size, mel_window=mel_window,
+                                      jit_compile=jit_compile, warmup=warmup)
+        return self.engine
+
+    def use_backend(self, backend):
+        """Instala um backend de inferência alternativo (ex.: TFLiteBackend).
+
+        O backend deve implementar `predict`, `encode_face` e
+        `predict_from_encoded`, como o `InferenceEngine`.
+        """
+        self.engine = backend
+        return backend
+
     def predict(self, face_frame, mel_features):
         """Gera um frame sincronizado."""
-        # Preprocessar entrada
-        face_frame = tf.image.resize(face_frame, (96, 96))
+        # Preprocessar entrada (redimensionar só se ainda não estiver em 96x96)
+        if tuple(face_frame.shape[-3:-1]) != (96, 96):
+            face_frame = tf.image.resize(face_frame, (96, 96))
         face_frame = (face_frame / 127.5) - 1.0  # Normalizar para [-1, 1]
         
         # Adicionar dimensão de batch se necessário
@@ -117,3 +138,73 @@ class Wav2LipModel:
         synced_frame = tf.clip_by_value(synced_frame, 0, 255)
         
         return synced_frame[0]  # Remover dimensão de batch
+
+    def predict_batch(self, face_frames, mel_batch, batch_size=64):
+        """Gera frames sincronizados em lotes.
+
+        `face_frames` deve ter shape (N, 96, 96, 3) em uint8/float (0-255) e
+        `mel_batch` shape (N, 80, janela, 1). Cada lote executa um único
+        forward pass, evitando o overhead de `model.predict` por frame.
+        """
+        face_frames = np.asarray(face_frames, dtype=np.float32)
+        mel_batch = np.asarray(mel_batch, dtype=np.float32)
+        if self.engine is not None:
+            return self.engine.predict(np.clip(face_frames, 0, 255).astype(np.uint8), mel_batch)
+
+        outputs = []
+        for start in range(0, len(face_frames), batch_size):
+            faces = face_frames[start:start + batch_size] / 127.5 - 1.0
+            mels = mel_batch[start:start + batch_size]
+
+            synced = self.model.predict_on_batch([faces, mels])
+
+            synced = (np.asarray(synced) + 1.0) * 127.5
+            outputs.append(np.clip(synced, 0, 255).astype(np.uint8))
+
+        if not outputs:
+            return np.zeros((0, 96, 96, 3), dtype=np.uint8)
+
+        return np.concatenate(outputs, axis=0)
+
+    def encode_face(self, face_frames):
+        """Codifica faces (N, 96, 96, 3) com o `face_encoder`.
+
+        O resultado pode ser reutilizado em `predict_from_encoded` quando a
+        mesma face é combinada com várias janelas de áudio.
+        """
+        if self.engine is not None:
+            return self.engine.encode_face(np.asarray(face_frames, dtype=np.uint8))
+
+        faces = np.asarray(face_frames, dtype=np.float32) / 127.5 - 1.0
+        return np.asarray(self.face_encoder.predict_on_batch(faces))
+
+    def predict_from_encoded(self, face_features, mel_batch, batch_size=64):
+        """Gera frames a partir de faces já codificadas.
+
+        Executa apenas `audio_encoder` + `generator` por lote. Se
+        `face_features` tiver uma única entrada, ela é usada para todas as
+        janelas de `mel_batch`.
+        """
+        face_features = np.asarray(face_features, dtype=np.float32)
+        mel_batch = np.asarray(mel_batch, dtype=np.float32)
+        if self.engine is not None:
+            return self.engine.predict_from_encoded(face_features, mel_batch)
+
+        outputs = []
+        for start in range(0, len(mel_batch), batch_size):
+            mels = mel_batch[start:start + batch_size]
+            if len(face_features) == 1:
+                features = np.broadcast_to(face_features, (len(mels),) + face_features.shape[1:])
+            else:
+                features = face_features[start:start + batch_size]
+
+            encoded_audio = self.audio_encoder.predict_on_batch(mels)
+            synced = self.generator.predict_on_batch([features, encoded_audio])
+
+            synced = (np.asarray(synced) + 1.0) * 127.5
+            outputs.append(np.clip(synced, 0, 255).astype(np.uint8))
+
+        if not outputs:
+            return np.zeros((0, 96, 96, 3), dtype=np.uint8)
+
+        return np.concatenate(outputs, axis=0)